@@ -0,0 +1,83 @@
+import os
+import tempfile
+import sqlalchemy as sa
+import ijik
+from ijik.importer import Importer
+from ijik.monitor import Table
+
+# shared setup for the benchmarks. with ijik installed (pip install -e .), run eg.
+#
+#     python benchmarks/monitor.py --registrants 1000
+#
+# (the models can only be mapped once per process, so each run creates one app)
+
+monitor_keys = ijik.KeyRegistry()
+
+@monitor_keys.view("bench")
+def monitor_view(db):
+    return [
+        Table("Ilmoittautuneet", lambda: db.query(ijik.Registrant).order_by(ijik.Registrant.id)),
+        Table("Joukkueet", lambda: db.query(ijik.Team).order_by(ijik.Team.id)),
+        Table("Osallistujat", lambda: db.query(ijik.Member).order_by(ijik.Member.id))
+    ]
+
+def create_app(plugins=(), **kwargs):
+    return ijik.create_app(
+            db_path = os.path.join(tempfile.mkdtemp(), "db.sqlite3"),
+            plugins = [
+                ijik.EditorPlugin(),
+                ijik.MembersPlugin(),
+                ijik.MonitorPlugin(monitor_keys),
+                *plugins
+            ],
+            **kwargs
+    )
+
+# `registrants` registrants, each with `members` members and `teams` teams of
+# `team_size` members, bulk inserted through the importer
+def populate(ijik_app, registrants, members=10, teams=2, team_size=3):
+    data = ({
+        "name": f"Ilmoittaja {i}",
+        "members": [
+            {"first_name": f"Etunimi {j}", "last_name": f"Sukunimi {i}"}
+            for j in range(members)
+        ],
+        "teams": [
+            {"name": f"Joukkue {i}-{j}", "members": [(j*team_size + k) % members for k in range(team_size)]}
+            for j in range(teams)
+        ]
+    } for i in range(registrants))
+
+    return dict(Importer(ijik_app).run(data))
+
+# counts the statements run on the app's engines
+class StatementCounter:
+
+    def __init__(self, ijik_app):
+        sessionmanager = ijik_app.sessionmanager
+        self.engines = [sessionmanager.engine]
+        if sessionmanager.async_engine is not None:
+            self.engines.append(sessionmanager.async_engine.sync_engine)
+        self.statements = []
+
+    def _listen(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        for engine in self.engines:
+            sa.event.listen(engine, "before_cursor_execute", self._listen)
+        return self
+
+    def __exit__(self, *exc):
+        for engine in self.engines:
+            sa.event.remove(engine, "before_cursor_execute", self._listen)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def clear(self):
+        self.statements.clear()
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[int(q * (len(values)-1))]
@@ -0,0 +1,90 @@
+import argparse
+import timeit
+import pluggy
+import ijik
+from ijik.entity import Hooks
+
+# Session.add and update hook dispatch with plugins that each hook one entity class, eg.
+#
+#     python benchmarks/dispatch.py --plugins 20
+#
+# the database is a stand-in that does nothing, so this measures only the hook calls.
+# "pluggy" calls every plugin's entity_hook wrapper for every entity (what the session
+# did before EntityManager.dispatch_table), "table" calls only the hookimpls of the
+# entity's class. the times are the best of --repeat runs.
+
+class DB:
+
+    def add(self, entity):
+        pass
+
+    def flush(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+class Registrant:
+    pass
+
+class Team:
+    pass
+
+class Member:
+    pass
+
+# like the validation and jsonblob plugins: a validator and a transaction hook, for one
+# entity class each
+def make_plugin(name):
+    class Plugin:
+
+        @ijik.hookimpl
+        @ijik.validator
+        @ijik.entity_hook(name)
+        def ijik_add_entity(self, entity):
+            pass
+
+        @ijik.hookimpl
+        @ijik.entity_hook(name)
+        def ijik_update_entity(self, entity, session):
+            yield
+            yield
+
+    return Plugin()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plugins", type=int, default=20)
+    parser.add_argument("--number", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pluginmanager = pluggy.PluginManager("ijik")
+    pluginmanager.add_hookspecs(Hooks)
+    classes = (Registrant, Team, Member)
+    for i in range(args.plugins):
+        pluginmanager.register(make_plugin(classes[i % len(classes)].__name__))
+
+    entitymanager = ijik.EntityManager(pluginmanager)
+    session = entitymanager.session(DB())
+
+    print(f"Session.add and update, {args.plugins} plugins")
+    for mode in ("pluggy", "table"):
+        if mode == "pluggy":
+            entitymanager.dispatch_table = lambda hookname, name: None
+        else:
+            del entitymanager.dispatch_table
+
+        for cls in classes:
+            entity = cls()
+            add = min(timeit.repeat(lambda: session.add(entity),
+                number=args.number, repeat=args.repeat)) / args.number
+            update = min(timeit.repeat(lambda: session.update(entity),
+                number=args.number, repeat=args.repeat)) / args.number
+            print(f"  {mode:7} {cls.__name__:11} add {add*1e6:6.2f}us  update {update*1e6:6.2f}us")
+
+if __name__ == "__main__":
+    main()
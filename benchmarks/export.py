@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import time
+import tracemalloc
+from common import StatementCounter, create_app, populate
+
+# peak memory of a monitor csv download, eg.
+#
+#     python benchmarks/export.py --registrants 10000      # 100k members
+#
+# the download is streamed, so the peak should stay flat as the table grows. the
+# response goes through the app with a bare asgi call that drops the body chunks,
+# a test client would buffer the whole body and measure that instead.
+
+async def download(app, path):
+    size = 0
+    status = None
+    done = asyncio.Event()
+    requests = [{ "type": "http.request", "body": b"", "more_body": False }]
+
+    # the request, then the disconnect once the response is sent (streaming
+    # responses listen for it while they send)
+    async def receive():
+        if requests:
+            return requests.pop()
+        await done.wait()
+        return { "type": "http.disconnect" }
+
+    async def send(message):
+        nonlocal size, status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    scope = {
+        "type": "http",
+        "asgi": { "version": "3.0" },
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [ (b"host", b"bench") ],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80)
+    }
+
+    await app(scope, receive, send)
+    assert status == 200, status
+    return size
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--registrants", type=int, default=10000)
+    parser.add_argument("--table", default="osallistujat", choices=("osallistujat", "joukkueet"))
+    args = parser.parse_args()
+
+    app = create_app()
+    populate(app.state.ijik, args.registrants, members=10, teams=1, team_size=3)
+    path = f"/monitor/bench/download/{args.table}.csv"
+
+    # the first request sets up the app (routes, templates), measure the second
+    asyncio.run(download(app, path))
+
+    with StatementCounter(app.state.ijik) as statements:
+        tracemalloc.start()
+        t = time.perf_counter()
+        size = asyncio.run(download(app, path))
+        t = time.perf_counter() - t
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    rows = args.registrants * (10 if args.table == "osallistujat" else 1)
+    print(f"{args.table}.csv, {rows} rows, {size/2**20:.1f} MiB: "
+          f"peak {peak/2**20:.1f} MiB (traced), {len(statements)} statements, {t:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import argparse
+import time
+from fastapi.testclient import TestClient
+import ijik
+from common import StatementCounter, create_app, populate
+
+# monitor page and table page renders with their statement counts, eg.
+#
+#     python benchmarks/monitor.py --registrants 1000     # 10k members and teams
+#
+# each page loads its rows and their relationships in a fixed number of statements,
+# so the counts shouldn't change with the table size or the offset.
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--registrants", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    ijik_app = app.state.ijik
+    populate(ijik_app, args.registrants, members=10, teams=10, team_size=3)
+
+    monitor = next(p.monitor for p in ijik_app.pluginmanager.get_plugins()
+            if isinstance(p, ijik.MonitorPlugin))
+    client = TestClient(app)
+    rows = args.registrants * 10
+    paths = [
+        "/monitor/bench/",
+        "/monitor/bench/table/joukkueet?offset=0&limit=100",
+        f"/monitor/bench/table/joukkueet?offset={rows - 100}&limit=100",
+        "/monitor/bench/table/joukkueet?offset=0&limit=100&sort=Ilmoittaja",
+        "/monitor/bench/table/osallistujat?offset=0&limit=100",
+        f"/monitor/bench/table/osallistujat?offset={rows - 100}&limit=100&sort=-Sukunimi",
+    ]
+
+    print(f"{rows} members and teams")
+    with StatementCounter(ijik_app) as statements:
+        for path in paths:
+            times = []
+            for _ in range(args.repeat):
+                # (what a write does, otherwise the repeats are cache hits)
+                monitor.cache.invalidate()
+
+                statements.clear()
+                t = time.perf_counter()
+                r = client.get(path)
+                times.append(time.perf_counter() - t)
+                assert r.status_code == 200, r.text
+
+            print(f"  {path:70} {len(statements):3} statements  {min(times)*1e3:7.1f}ms")
+
+if __name__ == "__main__":
+    main()
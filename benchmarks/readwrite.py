@@ -0,0 +1,81 @@
+import argparse
+import asyncio
+import itertools
+import random
+import time
+import httpx
+from common import create_app, percentile, populate
+
+# monitor and editor reads mixed with member writes, per sqlite profile, eg.
+#
+#     python benchmarks/readwrite.py --profile default
+#     python benchmarks/readwrite.py --profile production
+#
+# readers load monitor table pages (random offset and sort, so the monitor cache doesn't
+# answer them) and the editor page of a random registrant. writers add members.
+
+async def run(app, keys, args):
+    transport = httpx.ASGITransport(app=app)
+    deadline = time.perf_counter() + args.duration
+    stats = { "read": [], "write": [], "errors": 0 }
+    names = itertools.count()
+    registrants = args.registrants
+
+    async def request(client, kind, method, url, **kwargs):
+        t = time.perf_counter()
+        r = await client.request(method, url, **kwargs)
+        if r.status_code != 200:
+            stats["errors"] += 1
+        stats[kind].append(time.perf_counter() - t)
+
+    def auth():
+        return { "Cookie": f"authkey={random.choice(keys)}" }
+
+    async def reader(client):
+        while time.perf_counter() < deadline:
+            if random.random() < 0.5:
+                table = random.choice(("joukkueet", "osallistujat"))
+                sort = random.choice(("Nimi", "-Nimi", "Ilmoittaja")) if table == "joukkueet" \
+                        else random.choice(("Sukunimi", "-Sukunimi", "Ilmoittaja"))
+                await request(client, "read", "GET", f"/monitor/bench/table/{table}",
+                        params={"offset": random.randrange(registrants), "limit": 100, "sort": sort})
+            else:
+                await request(client, "read", "GET", "/", headers=auth())
+
+    async def writer(client):
+        while time.perf_counter() < deadline:
+            await request(client, "write", "POST", "/members/new", headers=auth(),
+                    json={"first_name": "Uusi", "last_name": f"Jäsen {next(names)}"})
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await asyncio.gather(
+                *(reader(client) for _ in range(args.readers)),
+                *(writer(client) for _ in range(args.writers))
+        )
+
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--profile", default="default")
+    parser.add_argument("--async-driver")
+    parser.add_argument("--registrants", type=int, default=1000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    app = create_app(db_profile=args.profile, db_async_driver=args.async_driver)
+    keys = list(populate(app.state.ijik, args.registrants).values())
+
+    stats = asyncio.run(run(app, keys, args))
+
+    print(f"profile {args.profile}, {args.readers} readers, {args.writers} writers, "
+          f"{args.duration:.0f}s, {stats['errors']} errors")
+    for kind in ("read", "write"):
+        t = stats[kind]
+        print(f"  {kind:5} {len(t)/args.duration:7.0f}/s  p50 {percentile(t, .5)*1e3:6.1f}ms"
+              f"  p99 {percentile(t, .99)*1e3:7.1f}ms")
+
+if __name__ == "__main__":
+    main()
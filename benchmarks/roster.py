@@ -0,0 +1,84 @@
+import argparse
+import collections
+import random
+import time
+import sqlalchemy as sa
+from fastapi.testclient import TestClient
+from ijik.base import AssociationIds
+from common import StatementCounter, create_app, percentile
+
+# team roster updates through PATCH /teams/{id} member_ids, with their statements, eg.
+#
+#     python benchmarks/roster.py --size 50
+#
+# "diff" is Team.member_ids as is, it only deletes and inserts the changed associations.
+# "replace" assigns a new association collection like the association_proxy creator did.
+# (sqlalchemy matches the new associations to the old rows by their (team, member) key,
+# so it writes the same rows, but every association is recreated and flushed.)
+
+def replace(self, obj, ids):
+    setattr(obj, self.assoc, [self.creator(id) for id in dict.fromkeys(ids)])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    app = create_app()
+    client = TestClient(app)
+    client.post("/", data={"name": "Ilmoittaja"}, follow_redirects=False)
+    ids = [m["id"] for m in client.post("/members/batch", json=[
+        {"first_name": f"Etunimi {i}", "last_name": "Sukunimi"} for i in range(args.size + 10)
+    ]).json()]
+    roster = ids[:args.size]
+    team = client.post("/teams/new", json={"name": "Joukkue", "member_ids": roster}).json()
+
+    # each update is a new order of the roster, or one member swapped for another
+    def reorder():
+        return random.sample(roster, len(roster))
+
+    def swap():
+        nonlocal roster
+        roster = roster[1:] + [next(id for id in ids if id not in roster)]
+        return roster
+
+    # the writes are executemany, so count their rows too
+    rows = collections.Counter()
+
+    def count_rows(conn, cursor, statement, *args):
+        kind = statement.split()[0]
+        if kind in ("INSERT", "UPDATE", "DELETE"):
+            rows[kind] += cursor.rowcount
+
+    print(f"{args.size} member roster")
+    with StatementCounter(app.state.ijik) as statements:
+        for engine in statements.engines:
+            sa.event.listen(engine, "after_cursor_execute", count_rows)
+
+        for mode in ("diff", "replace"):
+            set_ids = AssociationIds.__set__
+            if mode == "replace":
+                AssociationIds.__set__ = replace
+
+            try:
+                for name, update in (("reorder", reorder), ("swap one", swap)):
+                    times = []
+                    for _ in range(args.repeat):
+                        member_ids = update()
+                        statements.clear()
+                        rows.clear()
+                        t = time.perf_counter()
+                        r = client.patch(f"/teams/{team['id']}", json={"member_ids": member_ids})
+                        times.append(time.perf_counter() - t)
+                        assert r.status_code == 200, r.text
+                        assert sorted(r.json()["member_ids"]) == sorted(member_ids)
+
+                    written = ", ".join(f"{n} {k}" for k, n in sorted(rows.items())) or "none"
+                    print(f"  {mode:7} {name:8} p50 {percentile(times, .5)*1e3:6.1f}ms  "
+                          f"{len(statements):3} statements, rows written: {written}")
+            finally:
+                AssociationIds.__set__ = set_ids
+
+if __name__ == "__main__":
+    main()
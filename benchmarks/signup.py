@@ -0,0 +1,58 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import httpx
+import ijik
+
+# concurrent signup throughput, eg.
+#
+#     python benchmarks/signup.py --profile production
+#     python benchmarks/signup.py --profile production --async-driver aiosqlite
+#
+# (the models can only be mapped once per process, so run each mode separately)
+
+async def signups(app, n, concurrency):
+    transport = httpx.ASGITransport(app=app)
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i):
+            async with sem:
+                t = time.perf_counter()
+                r = await client.post("/", data={"name": f"Ilmoittaja {i}"})
+                latencies.append(time.perf_counter() - t)
+                assert r.status_code == 303, r.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        total = time.perf_counter() - start
+
+    latencies.sort()
+    return total, latencies
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--async-driver")
+    parser.add_argument("--profile", default="default")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "db.sqlite3")
+    app = ijik.create_app(
+            db_path = db_path,
+            db_async_driver = args.async_driver,
+            db_profile = args.profile,
+            plugins = [ijik.EditorPlugin()]
+    )
+
+    total, latencies = asyncio.run(signups(app, args.n, args.concurrency))
+    p = lambda q: latencies[int(q * (len(latencies)-1))] * 1e3
+    print(f"{args.async_driver or 'sync (threadpool)'}, profile {args.profile}: "
+          f"{args.n/total:.0f} signups/s, p50 {p(.5):.1f}ms, p99 {p(.99):.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import argparse
+import os
+import sys
+import time
+import ijik
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "tests"))
+from smtpserver import start_smtp_server
+
+# a batch of mails through the pooled sender and with a connection per message, eg.
+#
+#     python benchmarks/smtp.py --messages 200 --latency 0.005
+#
+# against the stand-in smtp server of the tests, which sleeps `latency` seconds before
+# each reply. a connection per message (SMTPLibSender) waits on the greeting, ehlo,
+# login and quit for every message, the pool (PooledSMTPSender) once per connection.
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.005)
+    parser.add_argument("--connections", type=int, default=4)
+    args = parser.parse_args()
+
+    server = start_smtp_server(latency=args.latency)
+    port = server.server_address[1]
+    messages = [ ijik.Message(to_addr=f"bench{i}@example.com", subject="hi", text="hi")
+            for i in range(args.messages) ]
+
+    def connect_per_message():
+        sender = ijik.SMTPLibSender("user", "password", host="127.0.0.1", port=port)
+        for m in messages:
+            with sender() as send:
+                send(m)
+
+    def pooled(connections):
+        def run():
+            sender = ijik.PooledSMTPSender("user", "password", host="127.0.0.1", port=port,
+                    max_connections=connections)
+            try:
+                assert sender.send_all(messages) == [None] * len(messages)
+            finally:
+                sender.close()
+        return run
+
+    print(f"{args.messages} messages, {args.latency*1e3:.0f}ms per reply")
+    for name, run in (
+            ("connection per message", connect_per_message),
+            ("pooled, 1 connection", pooled(1)),
+            (f"pooled, {args.connections} connections", pooled(args.connections))):
+        server.messages.clear()
+        t = time.perf_counter()
+        run()
+        t = time.perf_counter() - t
+        assert len(server.messages) == args.messages
+        print(f"  {name:25} {t:6.2f}s  {args.messages/t:6.0f} messages/s")
+
+    server.shutdown()
+    server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import timeit
+import pluggy
+import ijik
+from ijik.entity import Hooks, TransactionHooks, check
+from ijik.helpers import generator_hook
+
+# per-transaction overhead of the entity hook pipeline, eg.
+#
+#     python benchmarks/transaction.py
+#
+# first the three phases of one transaction with different hook mixes, with
+# TransactionHooks and with helpers.generator_hook (what the session used before),
+# both including creating the generators. then Session.add and add_all per entity with
+# a database stand-in that does nothing. the times are the best of --repeat runs.
+
+def plain(entity):
+    return None
+
+def generator(entity):
+    yield
+    yield
+
+mixes = {
+    "none": (),
+    "4 plain": (plain,)*4,
+    "4 generators": (generator,)*4,
+    "2 plain, 2 generators": (plain, plain, generator, generator)
+}
+
+def transaction_hooks(hooks, entity):
+    h = TransactionHooks([f(entity) for f in hooks])
+    h.before_flush()
+    h.after_flush()
+    h.after_commit()
+
+def generator_hooks(hooks, entity):
+    h = generator_hook([f(entity) for f in hooks], endless=True)
+    check(next(h))
+    check(next(h))
+    next(h)
+
+class DB:
+
+    def add(self, entity):
+        pass
+
+    def flush(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+class Entity:
+    pass
+
+class Plain:
+
+    @ijik.hookimpl
+    def ijik_add_entity(self, entity):
+        return plain(entity)
+
+class Generator:
+
+    @ijik.hookimpl
+    def ijik_add_entity(self, entity):
+        return generator(entity)
+
+def best(f, args, number=None):
+    number = number or args.number
+    return min(timeit.repeat(f, number=number, repeat=args.repeat)) / number
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--number", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+
+    entity = Entity()
+
+    print("one transaction, three phases")
+    for name, hooks in mixes.items():
+        new = best(lambda: transaction_hooks(hooks, entity), args)
+        old = best(lambda: generator_hooks(hooks, entity), args)
+        print(f"  {name:22} TransactionHooks {new*1e6:5.2f}us  generator_hook {old*1e6:5.2f}us")
+
+    print(f"Session, per entity (add_all of {args.batch})")
+    for name, plugins in (("none", ()), ("2 plain, 2 generators", (Plain, Plain, Generator, Generator))):
+        pluginmanager = pluggy.PluginManager("ijik")
+        pluginmanager.add_hookspecs(Hooks)
+        for p in plugins:
+            pluginmanager.register(p())
+        session = ijik.EntityManager(pluginmanager).session(DB())
+
+        entities = [Entity() for _ in range(args.batch)]
+        add = best(lambda: session.add(entity), args)
+        add_all = best(lambda: session.add_all(entities), args,
+                number=max(1, args.number // args.batch)) / args.batch
+        print(f"  {name:22} add {add*1e6:5.2f}us  add_all {add_all*1e6:5.2f}us")
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,10 @@ hookspec = pluggy.HookspecMarker("ijik")
 
 from .app import Ijik, create_app
 from .base import Registrant, Team, TeamMember, Member
-from .db import SessionManager
+from .db import SQLiteProfile, SessionManager
 from .category import Category
-from .email import LogSender, Message, SMTPLibSender, TemplateMessage
-from .entity import Cancel, EntityManager, Errors, entity_hook, validator
+from .email import LogSender, Message, Outbox, OutboxMessage, PooledSMTPSender, SMTPLibSender, TemplateMessage
+from .entity import Cancel, EntityManager, Errors, entity_hook, transaction_cached, validator
 from .form import Field
 from .jsonblob import schema_map
 from .mixin import mixin
@@ -22,10 +22,19 @@ class Hooks:
     def ijik_plugin_start(self):
         pass
 
+    @ijik.hookspec
+    def ijik_plugin_stop(self):
+        pass
+
     @ijik.hookspec
     def ijik_app_setup(self):
         pass
 
+    # return indexes (sa.Index) on the mapped tables, DbPlugin creates them at setup
+    @ijik.hookspec
+    def ijik_db_indexes(self):
+        pass
+
     @ijik.hookspec
     def ijik_uncaught_exception(self, exc):
         pass
@@ -98,10 +107,17 @@ def create_app(*,
     ijik.init()
     ijik.setup()
 
+    # background workers (eg. the email outbox) run while the server is up
+    api.add_event_handler("startup", lambda: pluginmanager.hook.ijik_plugin_start())
+    api.add_event_handler("shutdown", lambda: pluginmanager.hook.ijik_plugin_stop())
+
+    # for tools working on the app outside of requests (eg. python -m ijik.import)
+    api.state.ijik = ijik
+
     return api
 
-def core_plugins(*, db_path="db.sqlite3"):
-    yield ijik.DbPlugin(db_path)
+def core_plugins(*, db_path="db.sqlite3", db_async_driver=None, db_profile="default"):
+    yield ijik.DbPlugin(db_path, async_driver=db_async_driver, profile=db_profile)
     yield ijik.FastAPIErrorsPlugin()
     yield ijik.DefaultFormRendererPlugin()
     yield ijik.LoggingPlugin()
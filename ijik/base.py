@@ -51,6 +51,8 @@ class IdentityMixin:
 
 class Registrant(MroReprMixin, IdentityMixin, AttributeMixin):
     __tablename__ = "registrants"
+    # monitor sorts by name (also through Team.registrant and Member.registrant)
+    __table_args__ = ( sa.Index("ix_registrants_name", "name"), )
 
     key = sa.Column(sa.Text, nullable=False, unique=True, index=True)
     event = sa.Column(sa.Text, nullable=False, default="")
@@ -87,8 +89,35 @@ class RegistrantOwnedMixin:
         if full:
             return f"registrant: {self.registrant.short_repr}"
 
+# list of ids through an association relationship, like association_proxy(assoc, attr),
+# but assigning a list only removes and adds the changed associations instead of replacing
+# the whole collection. (the associations have no order, so reordering changes nothing.)
+class AssociationIds:
+
+    def __init__(self, assoc, attr, creator):
+        self.assoc = assoc
+        self.attr = attr
+        self.creator = creator
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        return [getattr(a, self.attr) for a in getattr(obj, self.assoc)]
+
+    def __set__(self, obj, ids):
+        collection = getattr(obj, self.assoc)
+        ids = dict.fromkeys(ids)
+
+        for a in [a for a in collection if getattr(a, self.attr) not in ids]:
+            collection.remove(a)
+
+        existing = set(getattr(a, self.attr) for a in collection)
+        collection.extend(self.creator(id) for id in ids if id not in existing)
+
 class Team(MroReprMixin, IdentityMixin, RegistrantOwnedMixin, AttributeMixin):
     __tablename__ = "teams"
+    # monitor filters and sorts by category. (for name see UniqueTeams' index)
+    __table_args__ = ( sa.Index("ix_teams_category", "category"), )
 
     category = sa.Column(sa.Text, nullable=False, default="")
 
@@ -97,7 +126,7 @@ class Team(MroReprMixin, IdentityMixin, RegistrantOwnedMixin, AttributeMixin):
             passive_deletes=True,
             back_populates="team"
     )
-    member_ids = association_proxy("members_assoc", "member_id",
+    member_ids = AssociationIds("members_assoc", "member_id",
             creator=lambda x: TeamMember(member_id=x))
     members = association_proxy("members_assoc", "member")
 
@@ -107,6 +136,8 @@ class Team(MroReprMixin, IdentityMixin, RegistrantOwnedMixin, AttributeMixin):
 
 class Member(MroReprMixin, IdentityMixin, RegistrantOwnedMixin, AttributeMixin):
     __tablename__ = "members"
+    # monitor sorts by last name
+    __table_args__ = ( sa.Index("ix_members_last_name", "last_name"), )
 
     last_name = sa.Column(sa.Text, nullable=False)
     first_name = sa.Column(sa.Text, nullable=False)
@@ -116,7 +147,7 @@ class Member(MroReprMixin, IdentityMixin, RegistrantOwnedMixin, AttributeMixin):
             passive_deletes=True,
             back_populates="member"
     )
-    team_ids = association_proxy("teams_assoc", "team_id",
+    team_ids = AssociationIds("teams_assoc", "team_id",
             creator=lambda x: TeamMember(team_id=x))
     teams = association_proxy("teams_assoc", "team")
 
@@ -0,0 +1,52 @@
+import collections
+import threading
+import time
+
+_missing = object()
+
+# bounded LRU cache with a per-entry time to live.
+# sync routes run in fastapi's threadpool, so access is locked.
+class TTLCache:
+
+    def __init__(self, maxsize=128, ttl=60, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.data = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.data)
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                expires, value = self.data[key]
+            except KeyError:
+                return default
+
+            if expires < self.clock():
+                del self.data[key]
+                return default
+
+            self.data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl
+
+        with self.lock:
+            self.data[key] = (self.clock() + ttl, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            expires, value = self.data.pop(key, (None, default))
+            return value
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
@@ -1,4 +1,6 @@
+from fastapi.concurrency import run_in_threadpool
 import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import registry, sessionmaker
 
 class SessionManager:
@@ -6,11 +8,20 @@ class SessionManager:
     def __init__(self):
         self.engine = None
         self.Session = None
+        self.async_engine = None
+        self.AsyncSession = None
 
     def connect(self, *args, **kwargs):
         self.engine = sa.create_engine(*args, **kwargs)
         self.Session = sessionmaker(bind=self.engine)
 
+    # the async engine needs an async dbapi driver (eg. sqlite+aiosqlite://).
+    # if it's not connected, get_async_session falls back to running the sync session
+    # in the threadpool.
+    def connect_async(self, *args, **kwargs):
+        self.async_engine = create_async_engine(*args, **kwargs)
+        self.AsyncSession = sessionmaker(bind=self.async_engine, class_=AsyncSession)
+
     # fastapi will run non-async code in a threadpool
     async def get_session(self):
         session = self.Session()
@@ -19,5 +30,83 @@ class SessionManager:
         finally:
             session.close()
 
+    # the yielded session only supports `run_sync`, so anything touching the database
+    # (including lazy loads) must happen inside the function passed to it:
+    #
+    #     user = await db.run_sync(lambda db: db.query(...).one())
+    #
+    async def get_async_session(self):
+        if self.AsyncSession is None:
+            session = ThreadpoolSession(self.Session())
+        else:
+            session = self.AsyncSession()
+
+        try:
+            yield session
+        finally:
+            await session.close()
+
+    # create_all skips existing tables, so indexes added later are created separately
     def create_tables(self, metadata):
         metadata.create_all(self.engine)
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+
+# the index on `table`, created if it doesn't exist yet, so that several plugins can
+# ask for the same index
+def table_index(table, name, *columns, **kwargs):
+    for index in table.indexes:
+        if index.name == name:
+            return index
+
+    return sa.Index(name, *(table.c[c] for c in columns), **kwargs)
+
+class SQLiteProfile:
+
+    def __init__(self, pragmas=None, **engine_kwargs):
+        self.pragmas = dict(pragmas or {})
+        self.engine_kwargs = engine_kwargs
+
+    def listen(self, engine):
+        if not self.pragmas:
+            return
+
+        @sa.event.listens_for(engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for k,v in self.pragmas.items():
+                cursor.execute(f"PRAGMA {k}={v}")
+            cursor.close()
+
+sqlite_profiles = {
+    "default": SQLiteProfile(),
+
+    # WAL lets the monitor (and other readers) run while a write transaction is open.
+    # the pool is sized for anyio's default threadpool (40 threads), with some overflow
+    # for sessions held across awaits.
+    "production": SQLiteProfile(
+        pragmas = {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "mmap_size": 256 * 2**20,
+            "cache_size": -64 * 2**10, # negative = KiB
+        },
+        poolclass = sa.pool.QueuePool,
+        pool_size = 40,
+        max_overflow = 20
+    )
+}
+
+# fallback for AsyncSession when there is no async driver
+class ThreadpoolSession:
+
+    def __init__(self, sync_session):
+        self.sync_session = sync_session
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
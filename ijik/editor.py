@@ -1,10 +1,14 @@
+import functools
+import hashlib
 import fastapi
+from fastapi.responses import HTMLResponse, Response
 from fastapi.templating import Jinja2Templates
 import pluggy
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 import ijik
 from ijik.entity import check
-from ijik.login import authkey_login
+from ijik.cache import TTLCache, _missing
+from ijik.login import AuthkeyCache, authkey_login
 
 class Hooks:
 
@@ -18,6 +22,12 @@ class Hooks:
     def ijik_editor_create_signup(editor, kwargs):
         pass
 
+    # return an iterable of sqlalchemy loader options for the registrant query of the
+    # editor page, eg. [ selectinload(ijik.Registrant.teams) ]
+    @ijik.hookspec
+    def ijik_editor_load_options(editor):
+        pass
+
     @ijik.hookspec
     def ijik_editor_render(editor, db, registrant, template):
         pass
@@ -52,7 +62,11 @@ class Editor:
             pluginmanager: pluggy.PluginManager,
             sessionmanager: ijik.SessionManager,
             keyfunc=b58_time_rand_keygen(3, 5),
-            auth_cookie="authkey"
+            auth_cookie="authkey",
+            auth_cache_size=1024,
+            auth_cache_ttl=300,
+            page_cache=False,
+            page_cache_max_age=0
         ):
 
         self.templates = templates
@@ -60,13 +74,17 @@ class Editor:
         self.sessionmanager = sessionmanager
         self.keyfunc = keyfunc
         self.auth = authkey_login(cookie_name=auth_cookie)(self.get_user)
+        self.auth_cache = AuthkeyCache(maxsize=auth_cache_size, ttl=auth_cache_ttl) \
+                if auth_cache_size else None
+        self.page_cache = PageCache(pluginmanager, max_age=page_cache_max_age) \
+                if page_cache else None
 
         async def get_auth(
                 request: fastapi.Request,
-                db: Session = fastapi.Depends(sessionmanager.get_session)
+                db: AsyncSession = fastapi.Depends(sessionmanager.get_async_session)
             ):
 
-            user = self.auth.get_login(request, db)
+            user = await db.run_sync(lambda db: self.auth.get_login(request, db))
             if not user:
                 raise fastapi.HTTPException(403)
 
@@ -99,19 +117,102 @@ class Editor:
         return self.templates.get_template(template.template).render(**template.context)
 
     def render_signup(self, **context):
-        template = SignupTemplate(editor=self, **context)
-        self.pluginmanager.hook.ijik_editor_render_signup(editor=self, template=template, **context)
-        return self.templates.get_template(template.template).render(**template.context)
+        def render():
+            template = SignupTemplate(editor=self, **context)
+            self.pluginmanager.hook.ijik_editor_render_signup(editor=self, template=template, **context)
+            return self.templates.get_template(template.template).render(**template.context)
+        return self._render_anonymous("signup", context, render)
 
     def render_login(self, **context):
-        return self.templates.get_template("editor/login.html").render(**context)
+        return self._render_anonymous("login", context,
+                lambda: self.templates.get_template("editor/login.html").render(**context))
 
     def render_logout(self, **context):
-        return self.templates.get_template("editor/logout.html").render(**context)
+        return self._render_anonymous("logout", context,
+                lambda: self.templates.get_template("editor/logout.html").render(**context))
+
+    # pages without errors or submitted values are the same for every anonymous visitor
+    def _render_anonymous(self, page, context, render):
+        if self.page_cache is None or context.get("errors") is not None \
+                or context.get("schema") is not None:
+            return render()
+
+        request = context.get("request")
+        return self.page_cache.get((page, request and str(request.base_url)), render)
+
+    # wrap rendered html in a response, pages from the page cache get an etag and
+    # are answered with 304 if the client has them
+    def page_response(self, request, html):
+        if not isinstance(html, CachedPage):
+            return HTMLResponse(html)
+
+        headers = self.page_cache.headers(html)
+        if html.etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+
+        return HTMLResponse(html, headers=headers)
+
+    # `eager` loads everything the editor page renders in a fixed number of queries.
+    # api calls only need the registrant row so they don't use it, and get it by
+    # primary key through the auth cache when possible (see AuthkeyCache).
+    def get_user(self, key, db, eager=False):
+        if self.auth_cache is not None and not eager:
+            id = self.auth_cache.get(key)
+            if id is None:
+                return None
+            if id is not _missing:
+                user = db.get(ijik.Registrant, id)
+                if user is not None:
+                    return user
+                # deleted by another process, fall back to the query
+                self.auth_cache.invalidate(key)
+
+        query = db.query(ijik.Registrant)
+        if eager:
+            query = query.options(*self.load_options)
+        user = query.filter_by(key=key).one_or_none()
+
+        if self.auth_cache is not None:
+            self.auth_cache.set(key, user and user.id)
+
+        return user
+
+    @functools.cached_property
+    def load_options(self):
+        return [opt for opts in self.pluginmanager.hook.ijik_editor_load_options(editor=self)
+                for opt in opts]
+
+class CachedPage(str):
+    etag = None
+
+# rendered anonymous pages, keyed by page and base url (the templates use url_for).
+# pages are invalidated when the set of registered plugins changes.
+class PageCache:
+
+    def __init__(self, pluginmanager, max_age=0, maxsize=64):
+        self.pluginmanager = pluginmanager
+        self.max_age = max_age
+        self.cache = TTLCache(maxsize=maxsize, ttl=float("inf"))
 
-    @staticmethod
-    def get_user(key, db):
-        return db.query(ijik.Registrant).filter_by(key=key).one_or_none()
+    def get(self, key, render):
+        plugins = frozenset(self.pluginmanager.get_plugins())
+
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == plugins:
+            return cached[1]
+
+        page = CachedPage(render())
+        page.etag = f'"{hashlib.sha1(page.encode("utf8")).hexdigest()[:16]}"'
+        self.cache.set(key, (plugins, page))
+        return page
+
+    # the same urls serve logged in users, hence the vary
+    def headers(self, page):
+        return {
+            "ETag": page.etag,
+            "Cache-Control": f"public, max-age={self.max_age}" if self.max_age else "no-cache",
+            "Vary": "Cookie"
+        }
 
 class EditorTemplate:
 
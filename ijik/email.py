@@ -1,9 +1,18 @@
+import asyncio
+import base64
+import collections
+from concurrent.futures import ThreadPoolExecutor
 import contextlib
+import datetime
 from email.message import EmailMessage
 from email.utils import formatdate, make_msgid
 import functools
 import logging
 import smtplib
+import threading
+import time
+import uuid
+import sqlalchemy as sa
 import ijik
 
 class Message:
@@ -37,8 +46,29 @@ class TemplateMessage(Message):
     def text(self):
         return self.template.render(message=self)
 
-# XXX: this is blocking, an async implementation should be used for non-localhost servers
-# (run in asyncio.get_running_loop())
+# exceptions that concern a single message, other exceptions are taken to mean the
+# connection is broken
+message_errors = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+        smtplib.SMTPDataError, smtplib.SMTPNotSupportedError)
+
+# errors that concern a single message are returned per message, anything else (eg. the
+# server is down or the login failed) is raised
+def _message_results(results):
+    for e in results:
+        if e is not None and not isinstance(e, message_errors):
+            raise e
+    return results
+
+# 5xx replies won't succeed on a retry
+def permanent_error(exc):
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code >= 500
+    return isinstance(exc, smtplib.SMTPNotSupportedError)
+
+# note: this is blocking, use it through the Outbox so that requests don't wait on the
+# smtp server
 class SMTPLibSender:
 
     def __init__(self,
@@ -62,16 +92,24 @@ class SMTPLibSender:
             **smtp_args
         }
 
-    @contextlib.contextmanager
-    def __call__(self):
-        with smtplib.SMTP(**self.smtp_args) as smtp:
+    def connect(self):
+        smtp = smtplib.SMTP(**self.smtp_args)
+        try:
             if self.starttls:
                 smtp.starttls()
                 smtp.ehlo()
 
             if self.login:
                 smtp.login(*self.login)
+        except:
+            smtp.close()
+            raise
 
+        return smtp
+
+    @contextlib.contextmanager
+    def __call__(self):
+        with self.connect() as smtp:
             yield functools.partial(self._send, smtp)
 
     def _send(self, smtp, message):
@@ -97,6 +135,91 @@ class SMTPLibSender:
                 to_addrs=(message.to_addr, *self.bcc, *message.bcc)
         )
 
+# keeps up to `max_connections` connections open between sends, so mailers don't connect,
+# login and quit for every message. send_all sends a batch over all of them in parallel:
+#
+#     sender.send_all(messages)               # -> [None or exception for each message]
+#     await sender.send_all_async(messages)
+#
+# like TemplateMailerMixin.send_all, only message errors are returned, connection and
+# login errors are raised.
+# smtplib is blocking, so the parallel sends run in a thread per connection.
+class PooledSMTPSender(SMTPLibSender):
+
+    def __init__(self, *args, max_connections=4, max_idle=60, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_idle = max_idle
+        self.idle = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(max_connections)
+        self.executor = ThreadPoolExecutor(max_connections, thread_name_prefix="ijik-smtp")
+
+    @contextlib.contextmanager
+    def __call__(self):
+        yield self.send
+
+    def send(self, message):
+        # an idle connection may have been closed by the server, retry once on a new one
+        try:
+            with self.connection() as smtp:
+                return self._send(smtp, message)
+        except smtplib.SMTPServerDisconnected:
+            with self.connection(new=True) as smtp:
+                return self._send(smtp, message)
+
+    def send_all(self, messages):
+        futures = [self.executor.submit(self.send, m) for m in messages]
+        return _message_results([f.exception() for f in futures])
+
+    async def send_all_async(self, messages):
+        loop = asyncio.get_running_loop()
+        return _message_results(await asyncio.gather(
+                *(loop.run_in_executor(self.executor, self.send, m) for m in messages),
+                return_exceptions = True
+        ))
+
+    @contextlib.contextmanager
+    def connection(self, new=False):
+        with self.slots:
+            smtp = self.connect() if new else self._checkout()
+            try:
+                yield smtp
+            except message_errors:
+                self._checkin(smtp)
+                raise
+            except:
+                smtp.close()
+                raise
+            else:
+                self._checkin(smtp)
+
+    def _checkout(self):
+        with self.lock:
+            while self.idle:
+                smtp, used = self.idle.pop()
+                if time.monotonic() - used < self.max_idle:
+                    return smtp
+                _quit(smtp)
+
+        return self.connect()
+
+    def _checkin(self, smtp):
+        with self.lock:
+            self.idle.append((smtp, time.monotonic()))
+
+    def close(self):
+        self.executor.shutdown()
+        with self.lock:
+            for smtp, _ in self.idle:
+                _quit(smtp)
+            self.idle = []
+
+def _quit(smtp):
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        smtp.close()
+
 # For debugging
 class LogSender:
 
@@ -109,3 +232,229 @@ class LogSender:
 
     def _send(self, message):
         self.logger.info(f"Sending email -- {message}")
+
+# ---- Outbox ----------------------------------------
+
+def now():
+    return datetime.datetime.utcnow()
+
+class OutboxMessage:
+    __tablename__ = "outbox"
+
+    id = sa.Column(sa.Integer, primary_key=True)
+    # pending -> sending -> sent, or back to pending (retry) or failed
+    status = sa.Column(sa.Text, nullable=False, default="pending")
+    claim = sa.Column(sa.Text)
+    attempts = sa.Column(sa.Integer, nullable=False, default=0)
+    next_attempt = sa.Column(sa.DateTime, nullable=False, default=now)
+    created = sa.Column(sa.DateTime, nullable=False, default=now)
+    sent = sa.Column(sa.DateTime)
+    error = sa.Column(sa.Text)
+    message = sa.Column(sa.JSON, nullable=False)
+
+    __table_args__ = ( sa.Index("ix_outbox_due", "status", "next_attempt"), )
+
+    @staticmethod
+    def dump(message):
+        return {
+            "subject": message.subject,
+            "text": message.text,
+            "to_addr": message.to_addr,
+            "to_name": message.to_name,
+            "bcc": list(message.bcc),
+            "attachments": [
+                (name, base64.b64encode(content).decode("ascii"))
+                for name, content in message.attachments
+            ]
+        }
+
+    def load(self):
+        return Message(**{
+            **self.message,
+            "attachments": [
+                (name, base64.b64decode(content))
+                for name, content in self.message["attachments"]
+            ]
+        })
+
+# messages are stored in the outbox table and sent by a background thread, so sending
+# only costs an insert in the request. the worker sends all due messages over one
+# connection and retries failed ones with exponential backoff.
+# several processes may run a worker on the same database, messages are claimed with
+# a lease so only one of them sends each message.
+class Outbox:
+
+    def __init__(self, sessionmanager, sender, *,
+            batch_size=50,
+            max_attempts=8,
+            backoff=30,
+            max_backoff=3600,
+            lease=600,
+            poll_interval=60,
+            logger=logging.getLogger("ijik")
+        ):
+
+        self.sessionmanager = sessionmanager
+        self.sender = sender
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.logger = logger
+        self.thread = None
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+
+    # with `db` the message is added to the caller's transaction (and sent only if it
+    # commits), otherwise it's committed right away.
+    # note: from inside an entity hook always pass the hook's db. a separate session would
+    # wait on sqlite's write lock, which the hook's own transaction is holding.
+    def enqueue(self, message, db=None):
+        row = OutboxMessage(message=OutboxMessage.dump(message))
+
+        if db is None:
+            with self.sessionmanager.Session() as db:
+                db.add(row)
+                db.commit()
+        elif db.in_transaction():
+            # the worker is woken when the row is committed (see _wake_outboxes), waking
+            # it now would only find nothing to send
+            db.add(row)
+            db.info.setdefault("ijik.outbox_wake", set()).add(self.wake)
+            return
+        else:
+            # the caller already committed (eg. an after commit hook)
+            db.add(row)
+            db.commit()
+
+        self.wake.set()
+
+    # sender interface, eg. for TemplateMailerMixin
+    @contextlib.contextmanager
+    def __call__(self):
+        yield self.enqueue
+
+    def start(self):
+        if self.thread is not None:
+            return
+
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, name="ijik-outbox", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=10):
+        if self.thread is None:
+            return
+
+        self.stopped.set()
+        self.wake.set()
+        self.thread.join(timeout)
+        self.thread = None
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.drain()
+            except Exception:
+                self.logger.exception("Outbox worker failed")
+
+            self.wake.wait(self.poll_interval)
+            self.wake.clear()
+
+    # send everything that is due, returns the number of sent messages
+    def drain(self):
+        sent = 0
+
+        with self.sessionmanager.Session() as db:
+            batch = collections.deque(self._claim(db))
+            if not batch:
+                return 0
+
+            try:
+                with self.sender() as send:
+                    while batch:
+                        row = batch[0]
+                        try:
+                            send(row.load())
+                        except message_errors as e:
+                            batch.popleft()
+                            self._retry(db, row, e)
+                            continue
+                        # any other exception means the connection is gone, the row and
+                        # the rest of the batch are retried
+
+                        # the message is out, so it's marked sent even if the rest of the
+                        # batch fails
+                        batch.popleft()
+                        try:
+                            self._sent(db, row)
+                        except Exception:
+                            db.rollback()
+                            self._sent(db, row)
+                            raise
+                        sent += 1
+
+                        if not batch and not self.stopped.is_set():
+                            batch.extend(self._claim(db))
+            except Exception as e:
+                self.logger.exception("Outbox send failed")
+                db.rollback()
+                for row in batch:
+                    self._retry(db, row, e)
+
+        return sent
+
+    def _claim(self, db):
+        table = OutboxMessage.__table__
+        token = uuid.uuid4().hex
+        t = now()
+
+        due = (sa.select(table.c.id)
+                .where(table.c.status.in_(("pending", "sending")), table.c.next_attempt <= t)
+                .order_by(table.c.next_attempt)
+                .limit(self.batch_size))
+
+        db.execute(table.update()
+                .where(table.c.id.in_(due))
+                .values(
+                    status = "sending",
+                    claim = token,
+                    next_attempt = t + datetime.timedelta(seconds=self.lease)
+                ))
+        db.commit()
+
+        return db.query(OutboxMessage).filter_by(claim=token).order_by(OutboxMessage.id).all()
+
+    def _sent(self, db, row):
+        row.status = "sent"
+        row.sent = now()
+        row.attempts += 1
+        row.error = None
+        db.commit()
+
+    def _retry(self, db, row, exc):
+        row.attempts += 1
+        row.error = repr(exc)
+
+        if row.attempts >= self.max_attempts or permanent_error(exc):
+            row.status = "failed"
+            self.logger.error(f"Giving up on email to {row.message['to_addr']}: {exc!r}")
+        else:
+            row.status = "pending"
+            delay = min(self.backoff * 2**(row.attempts-1), self.max_backoff)
+            row.next_attempt = now() + datetime.timedelta(seconds=delay)
+
+        db.commit()
+
+# wakes the workers of the messages enqueued in a transaction once it commits
+def _wake_outboxes(db):
+    for wake in db.info.pop("ijik.outbox_wake", ()):
+        wake.set()
+
+def _discard_wakes(db, *args):
+    db.info.pop("ijik.outbox_wake", None)
+
+sa.event.listen(sa.orm.Session, "after_commit", _wake_outboxes)
+sa.event.listen(sa.orm.Session, "after_soft_rollback", _discard_wakes)
@@ -2,8 +2,9 @@ import functools
 import inspect
 import itertools
 import pluggy
+import sqlalchemy as sa
 import ijik
-from ijik.helpers import collect_exceptions, generator_hook, omit_argspec, wrap_argspec
+from ijik.helpers import collect_exceptions, omit_argspec, wrap_argspec
 
 # ---- Entity manager ----------------------------------------
 
@@ -12,6 +13,7 @@ class EntityManager:
     def __init__(self, pluginmanager):
         self.pluginmanager = pluginmanager
         self.managed = {}
+        self.dispatch_tables = {}
 
     def add_managed_class(self, name, hooks):
         if name in self.managed:
@@ -24,6 +26,48 @@ class EntityManager:
     def session(self, db):
         return Session(self, db)
 
+    # hookimpls made with entity_hook only do something for their own entity class, so
+    # they're left out of the other classes' tables instead of being called to return
+    # early. the table is rebuilt if the registered hookimpls change.
+    # (None means there are hookwrappers, those go through pluggy.)
+    def dispatch_table(self, hookname, name):
+        impls = getattr(self.pluginmanager.hook, hookname).get_hookimpls()
+
+        try:
+            cached, table = self.dispatch_tables[hookname, name]
+        except KeyError:
+            pass
+        else:
+            if cached == impls:
+                return table
+
+        if any(impl.hookwrapper or getattr(impl, "wrapper", False) for impl in impls):
+            table = None
+        else:
+            # pluggy calls the impls in reverse registration order
+            table = [impl for impl in reversed(impls)
+                    if getattr(impl.function, "ijik_entity", name) == name]
+
+        self.dispatch_tables[hookname, name] = (impls, table)
+        return table
+
+    def call_hook(self, hookname, /, **kwargs):
+        table = self.dispatch_table(hookname, kwargs["entity"].__class__.__name__)
+
+        if table is None:
+            return getattr(self.pluginmanager.hook, hookname)(**kwargs)
+
+        results = []
+        for impl in table:
+            res = impl.function(*(kwargs[arg] for arg in impl.argnames))
+            if res is not None:
+                results.append(res)
+
+        return results
+
+    def async_session(self, db):
+        return AsyncSession(self, db)
+
 class Session:
 
     def __init__(self, entitymanager, db):
@@ -34,29 +78,33 @@ class Session:
     def pluginmanager(self):
         return self.entitymanager.pluginmanager
 
+    @property
+    def cache(self):
+        return transaction_cache(self.db)
+
     def add(self, entity):
-        hook = self._hook(self.pluginmanager.hook.ijik_add_entity, entity=entity)
+        hooks = self._hooks("ijik_add_entity", entity=entity)
 
         try:
-            result = check(next(hook))
+            result = hooks.before_flush()
             self.db.add(entity)
             self.db.flush()
-            result += check(next(hook))
+            result += hooks.after_flush()
             self.db.commit()
         except Exception as e:
-            hook.throw(e)
+            hooks.cancel(e)
             self.db.rollback()
             raise
 
-        result += next(hook)
+        result += hooks.after_commit()
 
         return result
 
     def update(self, entity, /, **kwargs):
-        hook = self._hook(self.pluginmanager.hook.ijik_update_entity, entity=entity, kwargs=kwargs)
+        hooks = self._hooks("ijik_update_entity", entity=entity, kwargs=kwargs)
 
         try:
-            result = check(next(hook))
+            result = hooks.before_flush()
 
             # note: can't update __dict__ directly, use setattr here so sqlalchemy
             # detects the changes
@@ -64,42 +112,182 @@ class Session:
                 setattr(entity, k, v)
 
             self.db.flush()
-            result += check(next(hook))
+            result += hooks.after_flush()
             self.db.commit()
         except Exception as e:
-            hook.throw(e)
+            hooks.cancel(e)
             self.db.rollback()
             raise
 
-        result += next(hook)
+        result += hooks.after_commit()
 
         return result
 
     def delete(self, entity):
-        hook = self._hook(self.pluginmanager.hook.ijik_delete_entity, entity=entity)
+        hooks = self._hooks("ijik_delete_entity", entity=entity)
 
         try:
-            result = check(next(hook))
+            result = hooks.before_flush()
             self.db.delete(entity)
             self.db.flush()
-            result += check(next(hook))
+            result += hooks.after_flush()
             self.db.commit()
         except Exception as e:
-            hook.throw(e)
+            hooks.cancel(e)
             self.db.rollback()
             raise
 
-        result += next(hook)
+        result += hooks.after_commit()
 
         return result
 
-    def _hook(self, hook, /, **kwargs):
+    # the bulk versions run the hooks for each entity but flush and commit once.
+    # cancels are collected from every entity first and raised together, with each
+    # entity's errors under its index.
+
+    def add_all(self, entities):
+        return self._run_all(
+                "ijik_add_entity",
+                [(entity, {}) for entity in entities],
+                lambda entity, kwargs: self.db.add(entity)
+        )
+
+    # `updates` is a list of (entity, kwargs)
+    def update_all(self, updates):
+        def apply(entity, kwargs):
+            for k,v in kwargs.items():
+                setattr(entity, k, v)
+
+        return self._run_all(
+                "ijik_update_entity",
+                [(entity, { "kwargs": kwargs }) for entity, kwargs in updates],
+                lambda entity, hook_kwargs: apply(entity, hook_kwargs["kwargs"])
+        )
+
+    def delete_all(self, entities):
+        return self._run_all(
+                "ijik_delete_entity",
+                [(entity, {}) for entity in entities],
+                lambda entity, kwargs: self.db.delete(entity)
+        )
+
+    def _run_all(self, hookname, items, apply):
+        hooks = []
+        errors = Errors()
+
+        def phase(step):
+            results = []
+            for i, h in enumerate(hooks):
+                try:
+                    results.append(step(h))
+                except Cancel as e:
+                    errors.get(i, create=True).update(e.cause)
+            if errors.suberrors:
+                raise Cancel(errors)
+            return results
+
+        try:
+            for i, (entity, kwargs) in enumerate(items):
+                try:
+                    hooks.append(self._hooks(hookname, entity=entity, **kwargs))
+                except Cancel as e:
+                    errors.get(i, create=True).update(e.cause)
+                    hooks.append(TransactionHooks(()))
+
+            result = phase(TransactionHooks.before_flush)
+            for entity, kwargs in items:
+                apply(entity, kwargs)
+            self.db.flush()
+            result = [r + s for r, s in zip(result, phase(TransactionHooks.after_flush))]
+            self.db.commit()
+        except Exception as e:
+            for h in hooks:
+                h.cancel(e)
+            self.db.rollback()
+            raise
+
+        return [r + h.after_commit() for r, h in zip(result, hooks)]
+
+    def _hooks(self, hookname, /, **kwargs):
         kwargs.update({
             "session": self,
             "db": self.db
         })
 
-        return generator_hook(hook(**kwargs), endless=True)
+        return TransactionHooks(self.entitymanager.call_hook(hookname, **kwargs))
+
+# runs the sync Session through `db.run_sync`, so the hooks still get a sync sqlalchemy
+# session while the event loop is free during the transaction.
+class AsyncSession:
+
+    def __init__(self, entitymanager, db):
+        self.entitymanager = entitymanager
+        self.db = db
+
+    async def add(self, entity):
+        return await self._run(Session.add, entity)
+
+    async def update(self, entity, /, **kwargs):
+        return await self._run(Session.update, entity, **kwargs)
+
+    async def delete(self, entity):
+        return await self._run(Session.delete, entity)
+
+    async def add_all(self, entities):
+        return await self._run(Session.add_all, entities)
+
+    async def update_all(self, updates):
+        return await self._run(Session.update_all, updates)
+
+    async def delete_all(self, entities):
+        return await self._run(Session.delete_all, entities)
+
+    async def _run(self, method, /, *args, **kwargs):
+        return await self.db.run_sync(
+                lambda db: method(self.entitymanager.session(db), *args, **kwargs)
+        )
+
+# ---- Transaction cache ----------------------------------------
+# memo store shared by the hooks running in one transaction (`session.cache` in hooks),
+# eg. for plugin lookups that several entities of a bulk operation would repeat.
+# it's cleared when the transaction commits or rolls back.
+
+class TransactionCache(dict):
+
+    def get_or_set(self, key, f):
+        try:
+            return self[key]
+        except KeyError:
+            value = self[key] = f()
+            return value
+
+def transaction_cache(db):
+    try:
+        return db.info["ijik.cache"]
+    except KeyError:
+        cache = db.info["ijik.cache"] = TransactionCache()
+        return cache
+
+def _clear_transaction_cache(db, *args):
+    cache = db.info.get("ijik.cache")
+    if cache:
+        cache.clear()
+
+sa.event.listen(sa.orm.Session, "after_commit", _clear_transaction_cache)
+sa.event.listen(sa.orm.Session, "after_soft_rollback", _clear_transaction_cache)
+
+# memoizes a plugin method in the transaction cache. the method takes the entity session
+# after self, the other arguments are the cache key (so they must be hashable):
+#
+#     @ijik.transaction_cached
+#     def get_categories(self, session, registrant):
+#         ...
+#
+def transaction_cached(f):
+    @functools.wraps(f)
+    def w(self, session, *args):
+        return session.cache.get_or_set((w, self, *args), lambda: f(self, session, *args))
+    return w
 
 # ---- Transaction hooks (generator hooks) ----------------------------------------
 # e.g.
@@ -111,6 +299,76 @@ class Session:
 #        yield
 #        after_transaction()
 #
+# the hooks are advanced in three phases: before flush, after flush and after commit.
+# a non-generator hook (or the first yield of a generator) runs before flush, results
+# returned or yielded are collected, and an Errors result before commit cancels the
+# transaction. on cancel the exception is thrown into the generators that are still
+# running (letting it through just stops the generator).
+
+_stopped = object()
+
+class TransactionHooks:
+
+    __slots__ = ("generators", "results")
+
+    def __init__(self, results):
+        self.generators = []
+        self.results = []
+
+        for x in results:
+            if hasattr(x, "__next__"):
+                self.generators.append(x)
+            else:
+                self.results.append(x)
+
+    def before_flush(self):
+        out = self._advance()
+        return check(out) if out else out
+
+    def after_flush(self):
+        out = self._advance()
+        return check(out) if out else out
+
+    def after_commit(self):
+        return self._advance()
+
+    def cancel(self, exc):
+        running = []
+
+        for g in self.generators:
+            try:
+                g.throw(exc)
+            except StopIteration:
+                continue
+            except Exception as e:
+                if e is not exc:
+                    raise
+                continue
+            running.append(g)
+
+        self.generators = running
+
+    def _advance(self):
+        out = self.results
+        self.results = []
+
+        if not self.generators:
+            return out
+
+        running = []
+
+        # (next with a default is cheaper than catching StopIteration)
+        for g in self.generators:
+            x = next(g, _stopped)
+            if x is _stopped:
+                continue
+            running.append(g)
+            if x is not None:
+                out.append(x)
+
+        self.generators = running
+        return out
+
 
 class Hooks:
 
@@ -144,6 +402,9 @@ def entity_hook(name):
             sig = sig.replace(parameters=parameters)
             w.__signature__ = sig
 
+            # see EntityManager.dispatch_table
+            w.ijik_entity = name
+
         return w
 
     return deco
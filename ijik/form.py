@@ -1,5 +1,8 @@
+import functools
+import json
 import typing as ty
 import ijik
+from ijik.cache import TTLCache, _missing
 
 # mini-wtforms-kind of library, but:
 #     * can render to either js schema or html
@@ -16,6 +19,15 @@ class Hooks:
     def ijik_render_html_field(render, field, value, errors):
         pass
 
+    # return a function (value, errors) -> html, with everything that doesn't depend on
+    # the value or errors resolved once. compiling is only used when every plugin that
+    # implements ijik_render_html_field also implements this, otherwise (and for fields
+    # no plugin compiles) ijik_render_html_field is called on every render, so plain
+    # render overrides keep working.
+    @ijik.hookspec(firstresult=True)
+    def ijik_compile_html_field(render, field):
+        pass
+
 def config_proxy(key):
     @property
     def proxy(self):
@@ -43,6 +55,9 @@ class FormRenderer:
 
     def __init__(self, pluginmanager):
         self.pluginmanager = pluginmanager
+        self.js_cache = {}
+        # bounded, since fields are keyed by object
+        self.html_cache = TTLCache(maxsize=1024, ttl=float("inf"))
 
     def render_js(self, /, schema=None, field=None):
         if field is None:
@@ -60,26 +75,111 @@ class FormRenderer:
 
         return ret
 
+    # the js schema depends only on the schema and the registered plugins, so it's rendered
+    # once per schema and served as a pre-serialized json string.
+    # (plugins that render schemas should call this on app setup, after all plugins
+    # are registered, to fill the cache.)
+    def render_js_json(self, schema):
+        try:
+            return self.js_cache[schema]
+        except KeyError:
+            ret = self.js_cache[schema] = json.dumps(self.render_js(schema=schema))
+            return ret
+
     def render_html(self, /, schema=None, field=None, value=None, errors=None):
-        if field is None:
-            return "\n".join(self.render_html(
-                field = Field.from_pydantic(schema, f),
-                value = value and value.get(f.name),
-                errors = errors and errors.get(f.name)
-            ) for f in schema.__fields__.values())
-
-        ret = self.pluginmanager.hook.ijik_render_html_field(
-                render = self.render_html,
-                field = field,
-                value = value,
-                errors = errors
-        )
+        return self.compile_html(schema=schema, field=field)(value, errors)
 
-        if ret is None:
-            raise ValueError(f"No html renderer for field {field} of schema {schema}")
+    # compiled renderers are cached per schema (or field object), so plugins should
+    # keep their Field instances around instead of creating new ones on each render
+    def compile_html(self, /, schema=None, field=None):
+        key = schema if field is None else field
 
+        ret = self.html_cache.get(key, _missing)
+        if ret is not _missing:
+            return ret
+
+        if field is None:
+            ret = CompiledForm([
+                (f.name, CompiledField(
+                    self._compile_html_field(Field.from_pydantic(schema, f), schema)))
+                for f in schema.__fields__.values()
+            ])
+        else:
+            ret = CompiledField(self._compile_html_field(field, schema))
+
+        self.html_cache.set(key, ret)
         return ret
 
+    def _can_compile(self):
+        compilers = set(impl.plugin for impl in
+                self.pluginmanager.hook.ijik_compile_html_field.get_hookimpls())
+        return all(impl.plugin in compilers for impl in
+                self.pluginmanager.hook.ijik_render_html_field.get_hookimpls())
+
+    def _compile_html_field(self, field, schema):
+        if self._can_compile():
+            ret = self.pluginmanager.hook.ijik_compile_html_field(
+                    render = self.render_html,
+                    field = field
+            )
+
+            if ret is not None:
+                return ret
+
+        def render(value, errors):
+            ret = self.pluginmanager.hook.ijik_render_html_field(
+                    render = self.render_html,
+                    field = field,
+                    value = value,
+                    errors = errors
+            )
+
+            if ret is None:
+                raise ValueError(f"No html renderer for field {field} of schema {schema}")
+
+            return ret
+
+        render.fallback = True
+        return render
+
+# the empty form (no value, no errors) is the common case (eg. the signup page),
+# so it's rendered once and kept. only for compiled fields, the output of a plain
+# ijik_render_html_field may depend on the request.
+
+class CompiledField:
+
+    def __init__(self, render):
+        self.render = render
+        self.static = not getattr(render, "fallback", False)
+
+    def __call__(self, value=None, errors=None):
+        if value is None and errors is None and self.static:
+            return self.empty
+        return self.render(value, errors)
+
+    @functools.cached_property
+    def empty(self):
+        return self.render(None, None)
+
+class CompiledForm:
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.static = all(render.static for _, render in fields)
+
+    def __call__(self, value=None, errors=None):
+        if value is None and errors is None and self.static:
+            return self.empty
+
+        return "\n".join(render(
+            value and value.get(name),
+            errors and errors.get(name)
+        ) for name, render in self.fields)
+
+    @functools.cached_property
+    def empty(self):
+        return "\n".join(render(None, None) for _, render in self.fields)
+
 def get_config(schema, name=None):
     conf = getattr(schema, "__ijik_config__", None)
     if conf:
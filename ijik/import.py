@@ -0,0 +1,6 @@
+# python -m ijik.import, see ijik/importer.py
+import sys
+from ijik.importer import main
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,326 @@
+import argparse
+import csv
+import importlib
+import json
+import sys
+
+import ijik
+from ijik.editor import b58_time_rand_keygen
+
+# offline bulk import of registrants with their members and teams, run with
+#
+#     python -m ijik.import conf:app registrants.jsonl --keys keys.csv
+#
+# json lines input has one registrant per line, team members are indices into the
+# registrant's member list:
+#
+#     {"name": "Koulu", "attrs": {...},
+#      "members": [{"first_name": "A", "last_name": "B"}, ...],
+#      "teams": [{"name": "Joukkue", "category": "a", "members": [0, 1]}, ...]}
+#
+# csv input has one row per member, with columns prefixed by the entity, eg.
+#
+#     registrant.name,member.first_name,member.last_name,member.attrs.class,team.name
+#
+# rows are grouped by registrant name, members by name and teams by team name.
+# registrants without a key get one from `keygen`. the created keys are written
+# out as csv (name,key).
+
+# `errors` is a list of (where, error). for a cancelled entity transaction `cause` is the
+# Cancel's Errors, with the entity indices of the batch as keys.
+class ImportCancelled(Exception):
+
+    def __init__(self, errors, cause=None):
+        self.errors = errors
+        self.cause = cause
+
+        lines = []
+        for where, err in errors:
+            # nested errors are on their own lines, indent them under `where`
+            lines.append(f"{where}: " + str(err).replace("\n", "\n    "))
+        super().__init__("\n".join(lines))
+
+# ---- Input ----------------------------------------
+
+def read_jsonl(f):
+    for i, line in enumerate(f, start=1):
+        line = line.strip()
+        if not line:
+            continue
+
+        try:
+            r = json.loads(line)
+        except ValueError as e:
+            raise ImportCancelled([(f"line {i}", e)])
+
+        if not r.get("name"):
+            raise ImportCancelled([(f"line {i}", "missing name")])
+
+        yield r
+
+def _split_row(row):
+    parts = { "registrant": {}, "member": {}, "team": {} }
+
+    for col, value in row.items():
+        if not value:
+            continue
+
+        entity, _, attr = col.partition(".")
+        if entity not in parts:
+            raise ValueError(f"Unknown column: {col}")
+
+        if attr.startswith("attrs."):
+            parts[entity].setdefault("attrs", {})[attr[len("attrs."):]] = value
+        else:
+            parts[entity][attr] = value
+
+    return parts["registrant"], parts["member"], parts["team"]
+
+# columns that must have a value when the entity has any
+required_columns = {
+    "registrant": ("name", ),
+    "member": ("first_name", "last_name"),
+    "team": ("name", )
+}
+
+def read_csv(f):
+    registrants = {}
+    reader = csv.DictReader(f)
+
+    for row in reader:
+        try:
+            registrant, member, team = _split_row(row)
+        except ValueError as e:
+            raise ImportCancelled([(f"line {reader.line_num}", e)])
+
+        missing = [
+            f"{entity}.{col}"
+            for entity, props in (("registrant", registrant), ("member", member), ("team", team))
+            if props or entity == "registrant"
+            for col in required_columns[entity]
+            if col not in props
+        ]
+        if missing:
+            raise ImportCancelled([(f"line {reader.line_num}", f"missing {', '.join(missing)}")])
+
+        r = registrants.get(registrant["name"])
+        if r is None:
+            r = registrants[registrant["name"]] = {
+                **registrant,
+                "members": [],
+                "teams": [],
+                "_members": {},
+                "_teams": {}
+            }
+
+        if member:
+            name = (member.get("first_name"), member.get("last_name"))
+            if name not in r["_members"]:
+                r["_members"][name] = len(r["members"])
+                r["members"].append(member)
+            member_idx = r["_members"][name]
+        else:
+            member_idx = None
+
+        if team:
+            if team["name"] not in r["_teams"]:
+                r["_teams"][team["name"]] = len(r["teams"])
+                r["teams"].append({ **team, "members": [] })
+            t = r["teams"][r["_teams"][team["name"]]]
+            if member_idx is not None and member_idx not in t["members"]:
+                t["members"].append(member_idx)
+
+    for r in registrants.values():
+        del r["_members"], r["_teams"]
+        yield r
+
+readers = {
+    "jsonl": read_jsonl,
+    "csv": read_csv
+}
+
+# ---- Import ----------------------------------------
+
+class Importer:
+
+    def __init__(self, app, *, hooks=False, keygen=b58_time_rand_keygen(3, 5), batch_size=500):
+        self.sessionmanager = app.sessionmanager
+        self.entitymanager = app.entitymanager
+        self.hooks = hooks
+        self.keygen = keygen
+        self.batch_size = batch_size
+
+    # yields (name, key) of each imported registrant, one batch at a time
+    def run(self, registrants):
+        batch = []
+
+        for r in registrants:
+            batch.append(r)
+            if len(batch) >= self.batch_size:
+                yield from self.import_batch(batch)
+                batch = []
+
+        if batch:
+            yield from self.import_batch(batch)
+
+    def import_batch(self, batch):
+        for r in batch:
+            if not r.get("key"):
+                r["key"] = self.keygen()
+
+        db = self.sessionmanager.Session()
+        try:
+            if self.hooks:
+                self._import_hooks(db, batch)
+            else:
+                self._import_fast(db, batch)
+        finally:
+            db.close()
+
+        return [(r["name"], r["key"]) for r in batch]
+
+    # through the entity manager: validation, blob coercion etc. hooks run for every
+    # entity. everything in the batch is added in one transaction, team members are
+    # linked through the relationship so the member ids aren't needed before flush.
+    def _import_hooks(self, db, batch):
+        entities, where = [], []
+
+        for r in batch:
+            registrant = ijik.Registrant(**_props(r))
+            entities.append(registrant)
+            where.append(f"registrant {r['name']}")
+
+            members = []
+            for i, m in enumerate(r.get("members", ())):
+                members.append(ijik.Member(registrant=registrant, **m))
+                where.append(f"registrant {r['name']}, member {i}")
+            entities.extend(members)
+
+            for i, t in enumerate(r.get("teams", ())):
+                entities.append(ijik.Team(
+                    registrant = registrant,
+                    members_assoc = [ijik.TeamMember(member=members[j]) for j in t.get("members", ())],
+                    **_props(t)
+                ))
+                where.append(f"registrant {r['name']}, team {i}")
+
+        try:
+            self.entitymanager.session(db).add_all(entities)
+        except ijik.Cancel as e:
+            raise ImportCancelled([(where[i], err) for i, err in e.cause.suberrors.items()],
+                    cause=e.cause) from e
+
+    # plain inserts in one transaction, no hooks.
+    # ids aren't returned from executemany, but the rows are inserted in order while
+    # we hold the write lock, so they're read back by key (registrants) or in id order
+    # (members and teams of the just inserted registrants).
+    def _import_fast(self, db, batch):
+        Registrant = ijik.Registrant.__table__
+        Member = ijik.Member.__table__
+        Team = ijik.Team.__table__
+        TeamMember = ijik.TeamMember.__table__
+
+        try:
+            db.execute(Registrant.insert(), [_row(Registrant, _props(r)) for r in batch])
+            ids = dict(db.execute(
+                    Registrant.select()
+                    .with_only_columns([Registrant.c.key, Registrant.c.id])
+                    .where(Registrant.c.key.in_([r["key"] for r in batch]))
+            ).all())
+            registrant_ids = [ids[r["key"]] for r in batch]
+
+            member_ids = self._insert_owned(db, Member, batch, registrant_ids, "members")
+            team_ids = self._insert_owned(db, Team, batch, registrant_ids, "teams")
+
+            rows = [
+                { "team_id": team_id, "member_id": member_ids[r_idx][m_idx] }
+                for r_idx, r in enumerate(batch)
+                for t_idx, t in enumerate(r.get("teams", ()))
+                for team_id in (team_ids[r_idx][t_idx], )
+                for m_idx in t.get("members", ())
+            ]
+            if rows:
+                db.execute(TeamMember.insert(), rows)
+
+            db.commit()
+        except:
+            db.rollback()
+            raise
+
+    # returns the new ids as a list per registrant
+    def _insert_owned(self, db, table, batch, registrant_ids, key):
+        rows = [
+            _row(table, { **_props(x), "registrant_id": registrant_id })
+            for r, registrant_id in zip(batch, registrant_ids)
+            for x in r.get(key, ())
+        ]
+
+        if not rows:
+            return [[] for _ in batch]
+
+        db.execute(table.insert(), rows)
+        new_ids = iter(id for id, in db.execute(
+                table.select()
+                .with_only_columns([table.c.id])
+                .where(table.c.registrant_id.in_(registrant_ids))
+                .order_by(table.c.id)
+        ))
+
+        return [[next(new_ids) for _ in r.get(key, ())] for r in batch]
+
+# strip nested lists (members, teams) from an input object
+def _props(x):
+    return dict((k, v) for k, v in x.items() if k not in ("members", "teams"))
+
+# executemany needs the same keys on every row, leave the rest to column defaults
+def _row(table, props):
+    row = dict((c.name, props[c.name]) for c in table.columns if c.name in props)
+    for c in table.columns:
+        if c.name not in row and c.default is not None and not c.primary_key:
+            arg = c.default.arg
+            row[c.name] = arg({}) if callable(arg) else arg
+    return row
+
+# ---- Command line ----------------------------------------
+
+def load_app(spec):
+    module, _, attr = spec.partition(":")
+    api = getattr(importlib.import_module(module), attr or "app")
+    return api.state.ijik
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+            prog = "python -m ijik.import",
+            description = "Import registrants, members and teams from csv or json lines."
+    )
+    parser.add_argument("app", help="app to import into, eg. conf:app")
+    parser.add_argument("input", help="input file, - for stdin")
+    parser.add_argument("--format", choices=readers, help="input format (default: from file name)")
+    parser.add_argument("--keys", help="write name,key of the imported registrants here (default: stdout)")
+    parser.add_argument("--hooks", action="store_true",
+            help="run the entity hooks (validation etc.) instead of plain inserts")
+    parser.add_argument("--batch-size", type=int, default=500, help="registrants per transaction")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("csv" if args.input.endswith(".csv") else "jsonl")
+    importer = Importer(load_app(args.app), hooks=args.hooks, batch_size=args.batch_size)
+
+    inp = sys.stdin if args.input == "-" else open(args.input, newline="", encoding="utf8")
+    out = open(args.keys, "w", newline="", encoding="utf8") if args.keys else sys.stdout
+
+    n = 0
+    try:
+        writer = csv.writer(out)
+        writer.writerow(("name", "key"))
+        for name, key in importer.run(readers[fmt](inp)):
+            writer.writerow((name, key))
+            n += 1
+        print(f"Imported {n} registrants", file=sys.stderr)
+    except ImportCancelled as e:
+        print(f"Import cancelled (after {n} registrants):\n{e}", file=sys.stderr)
+        return 1
+    finally:
+        if inp is not sys.stdin:
+            inp.close()
+        if out is not sys.stdout:
+            out.close()
@@ -1,3 +1,5 @@
+from ijik.cache import TTLCache, _missing
+
 class AuthkeyLogin:
 
     def __init__(self, get, cookie_name="authkey", **cookie_kwargs):
@@ -26,3 +28,27 @@ def authkey_login(**kwargs):
     def ret(f):
         return AuthkeyLogin(f, **kwargs)
     return ret
+
+# authkey -> primary key of the user, so that authenticated api calls get the user by
+# primary key (often from the session's identity map) instead of by key. unknown keys are
+# cached too (with a shorter ttl), so guessing keys doesn't cost a query per guess.
+# note: the cache is per process, a user deleted elsewhere is noticed on the next lookup,
+# a user created elsewhere after a failed guess of its key only after negative_ttl.
+class AuthkeyCache:
+
+    def __init__(self, maxsize=1024, ttl=300, negative_ttl=30):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.negative_ttl = negative_ttl
+
+    # returns the cached id, None for a cached unknown key or `default` if not cached
+    def get(self, key, default=_missing):
+        return self.cache.get(key, default)
+
+    def set(self, key, id):
+        self.cache.set(key, id, ttl=self.negative_ttl if id is None else None)
+
+    def invalidate(self, key):
+        self.cache.pop(key)
+
+    def clear(self):
+        self.cache.clear()
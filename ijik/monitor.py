@@ -1,13 +1,22 @@
 import collections
 import csv
 import functools
+import hashlib
 import html
 import io
+import itertools
+import json
+import os
 import re
+import time
+import urllib.parse
 
 import fastapi
+import sqlalchemy as sa
+from sqlalchemy.orm import Query
 
 import ijik
+from ijik.cache import TTLCache, _missing
 
 class Hooks:
 
@@ -18,12 +27,15 @@ class Hooks:
 class Monitor:
 
     table_template = "monitor/table.html"
+    rows_template = "monitor/rows.html"
     main_template = "monitor/index.html"
     field_template = "monitor/field.html"
 
-    def __init__(self, *, pluginmanager, templates, get_view):
+    def __init__(self, *, pluginmanager, templates, get_view, cache_size=128, cache_ttl=60):
         self.pluginmanager = pluginmanager
+        self.cache = ViewCache(maxsize=cache_size, ttl=cache_ttl)
         self.table_template = templates.get_template(self.table_template)
+        self.rows_template = templates.get_template(self.rows_template)
         self.main_template = templates.get_template(self.main_template)
         self.field_template = templates.get_template(self.field_template)
         self.get_view = get_view
@@ -43,11 +55,28 @@ class Monitor:
     def setup(self, router):
         self.pluginmanager.hook.ijik_monitor_setup(monitor=self, router=router)
 
-    def add_field(self, cls, name=None, prio=0, **opt):
+    # `load` is a loader option (or a tuple of them) for the relationships the field uses,
+    # eg. load=joinedload(ijik.Member.registrant)
+    #
+    # `sql` is the column expression of the field's value, used for sorting, filtering and
+    # searching in the query instead of after evaluation. `join` is the relationship
+    # needed for the expression, eg. sql=ijik.Registrant.name, join=ijik.Member.registrant
+    #
+    # `searchable` defaults to whether the field has `sql`. computed fields that set it
+    # make text searches evaluate the whole table.
+    def add_field(self, cls, name=None, prio=0, load=(), sql=None, join=None, searchable=None,
+            **opt):
         if name is None:
             name = next(opt[x] for x in ("plaintext", "html", "json")).__name__
 
-        field = Field(name=name, prio=prio, **opt)
+        if not isinstance(load, (tuple, list)):
+            load = (load, )
+
+        if searchable is None:
+            searchable = sql is not None
+
+        field = Field(name=name, prio=prio, load=load, sql=sql, join=join, searchable=searchable,
+                **opt)
 
         if cls in self.fields:
             self.fields[cls].append(field)
@@ -76,17 +105,58 @@ class Monitor:
     def render_table(self, **context):
         return self.table_template.render(**context)
 
+    def render_rows(self, **context):
+        return self.rows_template.render(**context)
+
     def _auto_html(self, f):
         def render_html(entity):
             return self.field_template.render({"value": f(entity)})
         return render_html
 
+# rendered monitor content, keyed by (view key, table id, format, ...).
+# writes through the entity manager invalidate everything (see MonitorPlugin), the ttl
+# bounds staleness for writes that don't go through it (and for other worker processes,
+# which have their own caches).
+class ViewCache:
+
+    def __init__(self, maxsize=128, ttl=60):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.version = 0
+        # so that etags from before a restart or from another worker don't match
+        self.token = os.urandom(4).hex()
+
+    def invalidate(self):
+        self.version += 1
+        self.cache.clear()
+
+    def etag(self, key):
+        digest = hashlib.sha1(repr(key).encode("utf8")).hexdigest()[:16]
+        window = int(time.time() // self.ttl) if self.ttl else 0
+        return f'"{self.token}-{self.version}-{window}-{digest}"'
+
+    def get(self, key, render):
+        value = self.cache.get(key, _missing)
+        if value is not _missing:
+            return value
+
+        version = self.version
+        value = render()
+
+        # don't store content that may have been rendered from data older than an
+        # invalidation that happened during rendering
+        if self.version == version:
+            self.cache.set(key, value)
+
+        return value
+
 class View:
 
     def __init__(self, monitor):
         self.monitor = monitor
         self.widgets = []
         self.downloads = {}
+        self.pages = {}
 
     def add_download(self, id, dl):
         self.downloads[id] = dl
@@ -99,6 +169,17 @@ class View:
 
         return dl()
 
+    def add_page(self, id, page):
+        self.pages[id] = page
+
+    def get_page(self, id, **kwargs):
+        try:
+            page = self.pages[id]
+        except KeyError:
+            return None
+
+        return page(**kwargs)
+
     def add_widget(self, render, navi=None):
         self.widgets.append((render, navi))
 
@@ -109,12 +190,15 @@ class View:
                 navis = (n for _,n in self.widgets if n is not None)
         )
 
+# note: paging uses offset/limit, so if `get_entities` returns a query it should have
+# a stable order.
 class Table:
 
-    def __init__(self, title, get_entities, id=None, columns=None):
+    def __init__(self, title, get_entities, id=None, columns=None, page_size=100):
         self.title = title
         self.get_entities = get_entities
         self.columns = columns
+        self.page_size = page_size
 
         if id:
             self.id = id
@@ -123,58 +207,295 @@ class Table:
         self.monitor = monitor
         view.add_widget(self.render, navi=(self.id, self.title))
         view.add_download(f"{self.id}.csv", self.download)
+        view.add_page(self.id, self.page)
 
+    # only the first page is rendered here, the rest are loaded by the page as it's
+    # scrolled (see `page`)
     def render(self, **context):
-        return self.monitor.render_table(**context, table=self)
+        data = self.page_data(0, self.page_size).html
+        return self.monitor.render_table(
+                **context,
+                table = self,
+                data = data,
+                next = self._next_page(data, 0, self.page_size)
+        )
+
+    # see `select` for sort, filters and search
+    def page(self, offset, limit, format="html", **select):
+        data = self.page_data(offset, limit, **select)
+
+        if format == "json":
+            data = data.json
+            return "application/json", json.dumps({
+                "columns": data.columns,
+                "rows": [[c.json for c in r] for r in data.rows]
+            }, default=str)
+
+        data = data.html
+        return "text/html", self.monitor.render_rows(
+                table = self,
+                data = data,
+                next = self._next_page(data, offset, limit, **select)
+        )
+
+    def page_data(self, offset, limit, **select):
+        entities = self.select(**select)
+
+        if isinstance(entities, Query):
+            entities = entities.offset(offset).limit(limit)
+        else:
+            entities = entities[offset:offset+limit]
+
+        return self.table_data(entities)
+
+    # a full page means there may be more rows
+    def _next_page(self, data, offset, limit, sort=None, filters=None, search=None):
+        if data.height < limit:
+            return None
+
+        query = urllib.parse.urlencode({
+            "offset": offset + limit,
+            "limit": limit,
+            **({"sort": sort} if sort else {}),
+            **({"search": search} if search else {}),
+            "filter": [f"{k}={v}" for k,v in (filters or {}).items()]
+        }, doseq=True)
+
+        return f"table/{urllib.parse.quote(self.id)}?{query}"
+
+    # sort:    column name, prefixed with "-" for descending order.
+    # filters: {column: value}, compared against the plaintext value.
+    # search:  case-insensitive substring of any searchable column.
+    #
+    # for queries, fields with `sql` are handled in the query. the rest is done after
+    # evaluating the fields, which means loading the whole table.
+    def select(self, sort=None, filters=None, search=None):
+        entities = self.entities
+        filters = dict(filters or {})
+
+        if isinstance(entities, Query):
+            cls = entities.column_descriptions[0]["entity"]
+            fields = dict((f.name, f) for f in self.monitor.get_fields(cls.__name__))
+            joined = set()
+
+            def sql(query, field):
+                if field.join is not None and field.join not in joined:
+                    joined.add(field.join)
+                    query = query.join(field.join)
+                return query
+
+            for name, value in list(filters.items()):
+                field = fields.get(name)
+                if field is not None and field.sql is not None:
+                    entities = sql(entities, field).filter(field.sql == value)
+                    del filters[name]
+
+            if search:
+                searchable = [f for f in fields.values() if f.searchable]
+                if all(f.sql is not None for f in searchable):
+                    for f in searchable:
+                        entities = sql(entities, f)
+                    entities = entities.filter(sa.or_(*(
+                        sa.func.lower(f.sql).contains(search.lower(), autoescape=True)
+                        for f in searchable
+                    )))
+                    search = None
+
+            if sort:
+                field = fields.get(sort.lstrip("-"))
+                if field is not None and field.sql is not None:
+                    # primary key keeps the order stable for paging. it's in the same
+                    # direction, so an index on the column serves the whole order.
+                    direction = sa.desc if sort.startswith("-") else sa.asc
+                    entities = sql(entities, field).order_by(None).order_by(
+                            direction(field.sql),
+                            *map(direction, sa.inspect(cls).primary_key)
+                    )
+                    sort = None
+
+        if filters or search or sort:
+            entities = self._select_evaluated(list(entities), sort, filters, search)
+
+        return entities
+
+    def _select_evaluated(self, entities, sort, filters, search):
+        fields = {}
+
+        def get_fields(e):
+            cls = e.__class__.__name__
+            if cls not in fields:
+                fields[cls] = dict((f.name, f) for f in self.monitor.get_fields(cls))
+            return fields[cls]
+
+        def plaintext(e, name):
+            field = get_fields(e).get(name)
+            return field(e).plaintext if field else None
+
+        for name, value in filters.items():
+            entities = [e for e in entities if str(plaintext(e, name)) == value]
+
+        if search:
+            search = search.lower()
+            entities = [e for e in entities if any(
+                search in str(plaintext(e, f.name)).lower()
+                for f in get_fields(e).values() if f.searchable
+            )]
+
+        if sort:
+            name = sort.lstrip("-")
+            entities.sort(key=lambda e: _sort_key(plaintext(e, name)), reverse=sort.startswith("-"))
+
+        return entities
 
     def download(self):
-        return "text/csv", self.data.plaintext.csv
+        return "text/csv", self.iter_csv()
+
+    # stream the csv without materializing the table. queries are fetched in batches
+    # with yield_per, so memory use doesn't depend on the number of rows.
+    def iter_csv(self, batch_size=1000):
+        entities = self.entities
+
+        if isinstance(entities, Query):
+            classes = [entities.column_descriptions[0]["entity"].__name__]
+            entities = entities.yield_per(batch_size)
+        else:
+            classes = set(e.__class__.__name__ for e in entities)
+
+        columns, fields = self._plaintext_fields(classes)
+        writer = csv.writer(_Echo(), delimiter=';')
+        yield writer.writerow(columns)
+
+        entities = iter(entities)
+        while batch := list(itertools.islice(entities, batch_size)):
+            yield "".join(writer.writerow(self._plaintext_row(e, columns, fields)) for e in batch)
+
+    def _plaintext_fields(self, classes):
+        colprio = {}
+        fields = {}
+
+        for cls in classes:
+            fields[cls] = {}
+            for field in self.monitor.get_fields(cls):
+                if field._plaintext is None:
+                    continue
+                colprio[field.name] = min(field.prio, colprio.get(field.name, float("inf")))
+                fields[cls][field.name] = field
+
+        if self.columns:
+            columns = [c for c in self.columns if c in colprio]
+        else:
+            columns = sorted(colprio, key=lambda name: colprio[name])
+
+        return columns, fields
+
+    @staticmethod
+    def _plaintext_row(entity, columns, fields):
+        fields = fields[entity.__class__.__name__]
+        return [fields[c](entity).plaintext if c in fields else Value.empty.plaintext
+                for c in columns]
 
     @functools.cached_property
     def id(self):
         return re.sub(r'[^\w-]+', "-", self.title).strip("-").lower()
 
+    @functools.cached_property
+    def count(self):
+        if isinstance(self.entities, Query):
+            # without the loader options, they don't apply to a count
+            return self.get_entities().order_by(None).count()
+        return len(self.entities)
+
+    # if `get_entities` returns a query (instead of a list), the loader options of the
+    # fields are applied to it, so relationships are loaded with a fixed number of
+    # queries instead of one (or more) per row.
     @functools.cached_property
     def entities(self):
-        return self.get_entities()
+        entities = self.get_entities()
+
+        if isinstance(entities, Query):
+            entities = entities.options(*self._load_options(entities))
+
+        return entities
+
+    def _load_options(self, query):
+        cls = query.column_descriptions[0]["entity"]
+        for field in self.monitor.get_fields(cls.__name__):
+            if self.columns is None or field.name in self.columns:
+                yield from field.load
 
     @functools.cached_property
     def data(self):
-        colprio = collections.defaultdict(lambda: float("inf"))
-        values = []
+        return self.table_data(self.entities)
 
-        for e in self.entities:
-            vals = {}
-            for field in self.monitor.get_fields(e.__class__.__name__):
-                colprio[field.name] = min(field.prio, colprio[field.name])
-                vals[field.name] = field(e)
-            values.append(vals)
+    # columnar: one list of values per column. values are only evaluated when a
+    # format (plaintext/html/json) is requested.
+    def table_data(self, entities):
+        colprio = collections.defaultdict(lambda: float("inf"))
+        colfields = collections.defaultdict(set)
+        values = {}
+        fields = {}
+        height = 0
+
+        for e in entities:
+            cls = e.__class__.__name__
+            if cls not in fields:
+                fields[cls] = self.monitor.get_fields(cls)
+                for field in fields[cls]:
+                    colprio[field.name] = min(field.prio, colprio[field.name])
+                    colfields[field.name].add(field)
+                    values.setdefault(field.name, [])
+
+            for field in fields[cls]:
+                col = values[field.name]
+                # pad for rows of other classes that don't have this column
+                if len(col) < height:
+                    col.extend(itertools.repeat(Value.empty, height - len(col)))
+                col.append(Value(field, e))
+
+            height += 1
+
+        for col in values.values():
+            if len(col) < height:
+                col.extend(itertools.repeat(Value.empty, height - len(col)))
 
         if self.columns:
             columns = [c for c in self.columns if c in colprio]
         else:
             columns = sorted(colprio, key=lambda name: colprio[name])
 
-        return TableData(columns, values)
+        return TableData(columns, values, colfields, height)
+
+# numbers before strings, missing values last
+def _sort_key(value):
+    if value is None:
+        return (2, )
+    if isinstance(value, (int, float)):
+        return (0, value)
+    return (1, str(value))
+
+# file-like for csv.writer, returns the written line instead of buffering it
+class _Echo:
+
+    def write(self, s):
+        return s
 
 class TableData:
 
-    def __init__(self, columns, values):
+    def __init__(self, columns, values, fields, height):
         self.columns = columns
         self.values = values
+        self.fields = fields
+        self.height = height
 
     @property
     def width(self):
         return len(self.columns)
 
-    @property
-    def height(self):
-        return len(self.values)
-
     @property
     def rows(self):
-        for v in self.values:
-            yield (v.get(c, Value.empty) for c in self.columns)
+        if not self.columns:
+            return itertools.repeat((), self.height)
+        return zip(*(self.values[c] for c in self.columns))
 
     @functools.cached_property
     def csv(self):
@@ -197,23 +518,24 @@ class TableData:
         return self._filter_attr("json")
 
     def _filter_attr(self, attr):
-        # select only columns which have at least one row with `attr`
-        columns = set()
-
-        for v in self.values:
-            columns.update(c for c,x in v.items() if getattr(x, attr) is not None)
+        # select only columns which have at least one field that can render `attr`
+        columns = [c for c in self.columns if any(f.renders(attr) for f in self.fields[c])]
 
-            # have all columns
-            if len(columns) == len(self.columns):
-                return self
+        if len(columns) == len(self.columns):
+            return self
 
-        return TableData([c for c in self.columns if c in columns], self.values)
+        return TableData(columns, self.values, self.fields, self.height)
 
 class Field:
 
-    def __init__(self, name, prio, *, plaintext=None, html=None, json=None):
+    def __init__(self, name, prio, *, load=(), sql=None, join=None, searchable=False,
+            plaintext=None, html=None, json=None):
         self.name = name
         self.prio = prio
+        self.load = load
+        self.sql = sql
+        self.join = join
+        self.searchable = searchable
         self._plaintext = plaintext
         self._html = html
         self._json = json
@@ -233,19 +555,50 @@ class Field:
     def __call__(self, entity):
         return Value(self, entity)
 
+    # whether the field can give a non-None value for `attr` (see Value)
+    def renders(self, attr):
+        f = getattr(self, f"_{attr}")
+        if f:
+            return True
+        if f is False or attr == "plaintext":
+            return False
+        return self._plaintext is not None
+
+# there is one of these per cell, so they're kept small.
 class Value:
 
+    __slots__ = ("field", "entity", "_plaintext", "_html", "_json")
+
     def __init__(self, field, entity):
         self.field = field
         self.entity = entity
+        self._plaintext = _missing
+        self._html = _missing
+        self._json = _missing
 
-    @functools.cached_property
+    @property
     def plaintext(self):
+        if self._plaintext is _missing:
+            self._plaintext = self._eval_plaintext()
+        return self._plaintext
+
+    @property
+    def html(self):
+        if self._html is _missing:
+            self._html = self._eval_html()
+        return self._html
+
+    @property
+    def json(self):
+        if self._json is _missing:
+            self._json = self._eval_json()
+        return self._json
+
+    def _eval_plaintext(self):
         if self.field._plaintext:
             return self.field._plaintext(self.entity)
 
-    @functools.cached_property
-    def html(self):
+    def _eval_html(self):
         if self.field._html:
             return self.field._html(self.entity)
         if self.field._html is False:
@@ -254,8 +607,7 @@ class Value:
         if self.plaintext is not None:
             return html.escape(str(self.plaintext))
 
-    @functools.cached_property
-    def json(self):
+    def _eval_json(self):
         if self.field._json:
             return self.field._json(self.entity)
         if self.field._json is False:
@@ -32,12 +32,16 @@ class CategoriesPlugin:
         ijik.mixin(app.mixins.EditorTeamInfo)(EditorTeamCategory)
         app.templates.env.globals["category_name"] = self.category_name
 
+    # bulk adds check many teams of the same registrant
+    @ijik.transaction_cached
+    def get_category_ids(self, session, registrant):
+        return frozenset(cat.id for cat in self.get_categories(registrant))
+
     @ijik.hookimpl
     @ijik.validator
     @ijik.entity_hook("Team")
-    def ijik_add_entity(self, team):
-        allowed = self.get_categories(team.registrant)
-        if team.category not in (cat.id for cat in allowed):
+    def ijik_add_entity(self, team, session):
+        if team.category not in self.get_category_ids(session, team.registrant):
             raise ijik.Cancel({"category": "Virheellinen valinta"})
 
     @ijik.hookimpl
@@ -48,6 +52,6 @@ class CategoriesPlugin:
     @ijik.hookimpl
     def ijik_monitor_setup(self, monitor):
 
-        @monitor.field("Team", name="Sarja")
+        @monitor.field("Team", name="Sarja", sql=ijik.Team.category)
         def category(team):
             return team.category
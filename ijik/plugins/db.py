@@ -1,26 +1,42 @@
 import ijik
+from ijik.db import sqlite_profiles
 from ijik.base import Registrant, Team, Member, TeamMember
 
 __all__ = ["DbPlugin"]
 
 class DbPlugin:
 
-    def __init__(self, path):
+    def __init__(self, path, async_driver=None, profile="default"):
         self.path = path
+        self.async_driver = async_driver
+        self.profile = sqlite_profiles[profile] if isinstance(profile, str) else profile
 
     @ijik.hookimpl
     def ijik_plugin_init(self, app):
         self.registry = app.registry
         self.sessionmanager = app.sessionmanager
+        self.pluginmanager = app.pluginmanager
 
-    @ijik.hookimpl
+    # map the classes before other plugins set up, so that they can use mapped attributes
+    # (eg. loader options)
+    @ijik.hookimpl(tryfirst=True)
     def ijik_app_setup(self):
         self.sessionmanager.connect(
             f"sqlite:///{self.path}",
-            connect_args = { "check_same_thread": False }
+            connect_args = { "check_same_thread": False },
+            **self.profile.engine_kwargs
         )
-        
+        self.profile.listen(self.sessionmanager.engine)
+
+        # the async engine picks its own (async-adapted) pool, so only the pragmas apply here
+        if self.async_driver:
+            self.sessionmanager.connect_async(f"sqlite+{self.async_driver}:///{self.path}")
+            self.profile.listen(self.sessionmanager.async_engine.sync_engine)
+
         for cls in (Registrant, Team, Member, TeamMember):
             self.registry.map_declaratively(cls)
 
+        # indexes attach themselves to their tables, so create_tables picks them up
+        self.pluginmanager.hook.ijik_db_indexes()
+
         self.sessionmanager.create_tables(self.registry.metadata)
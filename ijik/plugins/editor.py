@@ -1,7 +1,7 @@
 import fastapi
 from fastapi.responses import HTMLResponse, RedirectResponse, Response
 import pydantic
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import ijik
 from ijik.editor import Editor, Hooks
@@ -24,7 +24,7 @@ class EditorPlugin:
     @ijik.hookimpl
     def ijik_plugin_init(self, app):
         self.api = app.api
-        self.get_session = app.get_session
+        self.get_session = app.sessionmanager.get_async_session
         self.mixins = app.mixins
         self.pluginmanager = app.pluginmanager
         self.entitymanager = app.entitymanager
@@ -47,6 +47,30 @@ class EditorPlugin:
         self.editor.setup(router)
         self.api.include_router(router)
 
+    # ---- auth cache invalidation ----------------------------------------
+
+    @ijik.hookimpl
+    @ijik.entity_hook("Registrant")
+    def ijik_add_entity(self, registrant):
+        key = registrant.key
+        yield
+        yield
+        # drop a negative entry for the new key
+        if self.editor.auth_cache is not None:
+            self.editor.auth_cache.invalidate(key)
+
+    @ijik.hookimpl
+    @ijik.entity_hook("Registrant")
+    def ijik_delete_entity(self, registrant):
+        # the instance is detached after commit, so read the key here
+        key = registrant.key
+        yield
+        yield
+        if self.editor.auth_cache is not None:
+            self.editor.auth_cache.invalidate(key)
+
+    # ----------------------------------------
+
     @ijik.hookimpl
     def ijik_editor_setup(self, editor, router):
         NewSignup = self.mixins.EditorNewSignup.to_class("NewSignup")
@@ -57,58 +81,64 @@ class EditorPlugin:
         @router.get("/", response_class=HTMLResponse)
         async def index(
                 request: fastapi.Request,
-                db: Session = fastapi.Depends(self.get_session)
+                db: AsyncSession = fastapi.Depends(self.get_session)
             ):
 
-            user = editor.auth.get_login(request, db)
-            if user:
-                return editor.render(
-                        db = db,
-                        registrant = user,
-                        request = request
-                )
-            else:
-                return editor.render_signup(
-                        db = db,
-                        schema = None,
-                        errors = None,
-                        request = request
-                )
+            def render(db):
+                user = editor.auth.get_login(request, db, eager=True)
+                if user:
+                    return editor.render(
+                            db = db,
+                            registrant = user,
+                            request = request
+                    )
+                else:
+                    return editor.page_response(request, editor.render_signup(
+                            db = db,
+                            schema = None,
+                            errors = None,
+                            request = request
+                    ))
+
+            return await db.run_sync(render)
 
         @router.post("/", response_class=HTMLResponse)
         async def signup(
                 request: fastapi.Request,
                 schema: NewSignup = fastapi.Depends(as_param(NewSignup, param=fastapi.Form)),
-                db: Session = fastapi.Depends(self.get_session)
+                db: AsyncSession = fastapi.Depends(self.get_session)
             ):
 
-            try:
-                user = editor.create_signup(schema.dict())
-                self.entitymanager.session(db).add(user)
-            except ijik.Cancel as e:
-                return editor.render_signup(
-                        db = db,
-                        schema = schema.dict(),
-                        errors = e.cause,
-                        request = request
-                )
-            else:
-                resp = RedirectResponse(request.url.path, status_code=303)
-                editor.login(resp, user)
-                return resp
+            def create(db):
+                try:
+                    user = editor.create_signup(schema.dict())
+                    self.entitymanager.session(db).add(user)
+                except ijik.Cancel as e:
+                    return editor.render_signup(
+                            db = db,
+                            schema = schema.dict(),
+                            errors = e.cause,
+                            request = request
+                    )
+                else:
+                    resp = RedirectResponse(request.url.path, status_code=303)
+                    editor.login(resp, user)
+                    return resp
+
+            return await db.run_sync(create)
 
         @router.get("/login", response_class=HTMLResponse)
         async def login_page(request: fastapi.Request):
-            return editor.render_login(request=request)
+            return editor.page_response(request, editor.render_login(request=request))
 
         @router.post("/login", response_class=HTMLResponse)
         async def login(
                 request: fastapi.Request,
                 schema: LoginRequest = fastapi.Depends(as_param(LoginRequest, param=fastapi.Form)),
-                db: Session = fastapi.Depends(self.get_session)
+                db: AsyncSession = fastapi.Depends(self.get_session)
             ):
 
-            user = editor.auth.get(schema.key, db=db)
+            user = await db.run_sync(lambda db: editor.auth.get(schema.key, db=db))
 
             if user:
                 resp = RedirectResponse(request.url_for("index"), status_code=303)
@@ -124,17 +154,17 @@ class EditorPlugin:
         @router.get("/logout")
         async def logout(
                 request: fastapi.Request,
-                db: Session = fastapi.Depends(self.get_session)
+                db: AsyncSession = fastapi.Depends(self.get_session)
             ):
 
-            user = editor.auth.get_login(request, db)
+            user = await db.run_sync(lambda db: editor.auth.get_login(request, db))
 
             if request.method == "POST":
                 resp = Response(content="")
             elif user:
                 resp = RedirectResponse(request.url.path)
             else:
-                resp = HTMLResponse(editor.render_logout(request=request))
+                resp = editor.page_response(request, editor.render_logout(request=request))
 
             if user:
                 editor.logout(resp, user)
@@ -1,7 +1,14 @@
 import functools
 import ijik
+from ijik.email import message_errors
 
-__all__ = ["TemplateMailerMixin"]
+__all__ = ["OutboxPlugin", "TemplateMailerMixin"]
+
+# closes the pooled connections (see PooledSMTPSender) when the app stops
+def close_sender(sender):
+    close = getattr(sender, "close", None)
+    if close is not None:
+        close()
 
 class TemplateMailerMixin:
 
@@ -19,7 +26,78 @@ class TemplateMailerMixin:
     def _template_mailer_plugin_init(self, app):
         self.template = app.templates.get_template(self.template)
 
-    def send(self, **kwargs):
+    @ijik.hookimpl(specname="ijik_plugin_stop")
+    def _template_mailer_plugin_stop(self):
+        close_sender(self.sender)
+
+    # in entity hooks pass the hook's `db`: with an outbox the message is then stored in
+    # the same transaction as the entity
+    def send(self, db=None, **kwargs):
         message = self.Message(**kwargs, template=self.template)
+
+        if db is not None and hasattr(self.sender, "enqueue"):
+            self.sender.enqueue(message, db)
+            return
+
         with self.sender() as send:
             send(message)
+
+    # returns None or the exception for each message
+    def send_all(self, messages):
+        messages = [self.Message(**kwargs, template=self.template) for kwargs in messages]
+
+        if hasattr(self.sender, "send_all"):
+            return self.sender.send_all(messages)
+
+        errors = []
+        with self.sender() as send:
+            for message in messages:
+                try:
+                    send(message)
+                except message_errors as e:
+                    errors.append(e)
+                else:
+                    errors.append(None)
+
+        return errors
+
+# stores outgoing email in the database and sends it from a background worker.
+# the plugin is itself a sender, so it's passed to the mailers in place of the real one:
+#
+#     outbox = ijik.OutboxPlugin(ijik.SMTPLibSender(...))
+#     create_app(plugins=[outbox, SignupMailer(sender=outbox), ...])
+#
+# mailers running in entity hooks pass the hook's db, so the message commits (or rolls
+# back) with the entity:
+#
+#     @ijik.hookimpl
+#     @ijik.entity_hook("Registrant")
+#     def ijik_add_entity(self, registrant, db):
+#         yield
+#         self.send(db=db, to_addr=registrant.email, ...)
+#
+class OutboxPlugin:
+
+    def __init__(self, sender, **config):
+        self.sender = sender
+        self.config = config
+
+    @ijik.hookimpl
+    def ijik_plugin_init(self, app):
+        app.registry.map_declaratively(ijik.OutboxMessage)
+        self.outbox = ijik.Outbox(app.sessionmanager, self.sender, **self.config)
+
+    @ijik.hookimpl
+    def ijik_plugin_start(self):
+        self.outbox.start()
+
+    @ijik.hookimpl
+    def ijik_plugin_stop(self):
+        self.outbox.stop()
+        close_sender(self.sender)
+
+    def __call__(self):
+        return self.outbox()
+
+    def enqueue(self, message, db=None):
+        self.outbox.enqueue(message, db)
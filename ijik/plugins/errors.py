@@ -12,9 +12,8 @@ def validation_error_cause(error):
     # strip location (body, query, etc.) added by fastapi
     loc = error["loc"][1:]
 
-    # skip root validator
-    if loc[0] == "__root__":
-        loc = loc[1:]
+    # skip root validators (also inside lists, eg. batch requests)
+    loc = [l for l in loc if l != "__root__"]
 
     for l in loc[::-1]:
         cause = { l: cause }
@@ -59,21 +59,33 @@ class DefaultHTMLRendererPlugin:
         self.templates = app.templates
 
     @ijik.hookimpl(trylast=True)
-    def ijik_render_html_field(self, field, value, errors):
+    def ijik_compile_html_field(self, field):
         kw = self._get_input_type(field.type_)
 
         if kw is None:
             return
 
         template = self.templates.get_template(field.template or self.template)
-        return template.render({
+        context = {
             **kw,
             "name": field.name,
             "label": field.label,
-            "placeholder": field.placeholder,
-            "value": value,
-            "errors": errors and errors.direct_causes,
-        })
+            "placeholder": field.placeholder
+        }
+
+        def render(value, errors):
+            return template.render({
+                **context,
+                "value": value,
+                "errors": errors and errors.direct_causes,
+            })
+
+        return render
+
+    @ijik.hookimpl(trylast=True)
+    def ijik_render_html_field(self, field, value, errors):
+        render = self.ijik_compile_html_field(field)
+        return render and render(value, errors)
 
     def _get_input_type(self, type_):
         container, type_ = unpack_container(type_)
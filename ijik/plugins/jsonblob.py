@@ -91,12 +91,21 @@ class StaticBlobMixin:
     def ijik_plugin_init_(self, app):
         self.renderer = app.form_renderer
 
+    def _render_editor_js(self):
+        return f"""{self.js_plugin}({{
+            attribute: {json.dumps(self.attribute)},
+            getSchema: ijik.blob.schema({self.renderer.render_js_json(self.schema)})
+        }}) """
+
+    # the editor js only depends on the schema, so render it once.
+    # (not on plugin init, the js renderer plugins may not be registered yet)
+    @ijik.hookimpl(specname="ijik_app_setup")
+    def ijik_app_setup_(self):
+        self.editor_js = self._render_editor_js()
+
     @ijik.hookimpl
     def ijik_editor_render(self, template):
-        template.js.append(f"""{self.js_plugin}({{
-            attribute: {json.dumps(self.attribute)},
-            getSchema: ijik.blob.schema({json.dumps(self.renderer.render_js(schema=self.schema))})
-        }}) """)
+        template.js.append(self.editor_js)
 
     @ijik.hookimpl
     def ijik_monitor_setup(self, monitor):
@@ -172,17 +181,26 @@ class DynamicBlobMixin:
     def ijik_plugin_init_(self, app):
         self.renderer = app.form_renderer
 
-    @ijik.hookimpl
-    def ijik_editor_render(self, template):
+    def _render_editor_js(self):
         rules = ", ".join(
-                f"[{match.js_matcher}, {json.dumps(self.renderer.render_js(schema=schema))}]"
+                f"[{match.js_matcher}, {self.renderer.render_js_json(schema)}]"
                 for match, schema in self.schema_map
         )
 
-        template.js.append(f"""{self.js_plugin}({{
+        return f"""{self.js_plugin}({{
             attribute: {json.dumps(self.attribute)},
             getSchema: ijik.blob.schemaMap([{rules}])
-        }})""")
+        }})"""
+
+    # the editor js only depends on the schema map, so render it once.
+    # (not on plugin init, the js renderer plugins may not be registered yet)
+    @ijik.hookimpl(specname="ijik_app_setup")
+    def ijik_app_setup_(self):
+        self.editor_js = self._render_editor_js()
+
+    @ijik.hookimpl
+    def ijik_editor_render(self, template):
+        template.js.append(self.editor_js)
 
     @classmethod
     def select_mixin(cls, blob):
@@ -1,4 +1,7 @@
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
 
 import sqlalchemy as sa
 
@@ -7,63 +10,85 @@ from ijik.helpers import wrap_argspec
 
 __all__ = ["LoggingPlugin"]
 
+# "Team#12" from the identity map, never loads anything
+def entity_ref(entity):
+    identity = sa.inspect(entity).identity
+    name = entity.__class__.__name__
+    return f"{name}#{','.join(map(str, identity))}" if identity else f"{name}(new)"
+
+# column values already on the instance (no loads)
+def loaded_columns(entity):
+    state = sa.inspect(entity)
+    return dict((c.key, state.dict[c.key]) for c in state.mapper.column_attrs if c.key in state.dict)
+
+# records only carry primary keys and the written columns, and are formatted by the handler
+# (%-style arguments), so nothing is loaded or formatted for levels that are filtered out.
+# the same values are in the record's `ijik` attribute for structured handlers.
 class DbOperationLoggerPlugin:
 
     def __init__(self, logger):
         self.logger = logger
 
-    @ijik.hookimpl
-    def ijik_app_init(self, app):
-        self.pluginmanager = app.pluginmanager
+    def log(self, level, op, ref, values=None, exc=None):
+        if exc is not None:
+            self.logger.log(level, "Cancel %s %s: %s", op, ref, exc,
+                    extra={"ijik": {"op": op, "entity": ref, "values": values, "cancel": exc}})
+        elif values is not None:
+            self.logger.log(level, "%s %s %s", op, ref, values,
+                    extra={"ijik": {"op": op, "entity": ref, "values": values}})
+        else:
+            self.logger.log(level, "%s %s", op, ref,
+                    extra={"ijik": {"op": op, "entity": ref}})
+
+    # (debug is below info, so if info is off there is nothing to log)
 
     @ijik.hookimpl(specname="ijik_add_entity")
     def ijik_add_entity(self, entity):
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+
         try:
             yield
+            # the instance is expired after commit, so read it here
+            ref, values = entity_ref(entity), loaded_columns(entity)
             yield
         except ijik.Cancel as exc:
-            self.logger.debug((
-                f"Cancel add: {entity}"
-                f"\n-> exception: {exc}"
-            ))
+            self.log(logging.DEBUG, "add", f"{entity.__class__.__name__}(new)", exc=exc)
         else:
-            self.logger.info(f"Created {entity}")
+            self.log(logging.INFO, "Created", ref, values)
 
     @ijik.hookimpl
     def ijik_update_entity(self, entity, kwargs):
-        #old = str(entity)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+
+        ref = entity_ref(entity)
+        # not from __dict__, some attributes are descriptors (eg. Team.member_ids)
+        old = dict((k, getattr(entity, k, None)) for k in kwargs)
 
         try:
             yield
             yield
         except ijik.Cancel as exc:
-            self.logger.debug((
-                f"Cancel update: {entity}"
-                f"\n-> update: {kwargs}"
-                f"\n-> exception: {exc}"
-            ))
+            self.log(logging.DEBUG, "update", ref, kwargs, exc=exc)
         else:
-            self.logger.info(f"Updated {kwargs} :: {entity}")
-            #self.logger.info((
-            #    f"Update {kwargs}"
-            #    f"\n->from: {old}"
-            #    f"\n->to:   {entity}"
-            #))
+            changes = dict((k, v) for k, v in kwargs.items() if old[k] != v)
+            self.log(logging.INFO, "Updated", ref, changes)
 
     @ijik.hookimpl
     def ijik_delete_entity(self, entity):
-        info = str(entity)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+
+        ref = entity_ref(entity)
 
         try:
             yield
             yield
         except ijik.Cancel as exc:
-            self.logger.debug((
-                f"Cancel delete: {entity}"
-                f"\n-> exception: {exc}"
-            ))
+            self.log(logging.DEBUG, "delete", ref, exc=exc)
         else:
-            self.logger.info(f"Deleted {info}")
+            self.log(logging.INFO, "Deleted", ref)
 
 class ExceptionLoggerPlugin:
 
@@ -84,6 +109,8 @@ class LoggingPlugin:
             file   = None
         ):
 
+        self.listener = None
+
         if file:
             handler = logging.FileHandler(file)
             if level:
@@ -91,13 +118,30 @@ class LoggingPlugin:
             if format:
                 handler.setFormatter(logging.Formatter(format))
 
-            logger.addHandler(handler)
+            # the file is written from the listener's thread, requests only put the
+            # records in the queue
+            queue = SimpleQueue()
+            self.listener = QueueListener(queue, handler, respect_handler_level=True)
+            self.listener.start()
+            atexit.register(self.stop)
+
+            logger.addHandler(QueueHandler(queue))
 
         if level:
             logger.setLevel(level)
 
         self.logger = logger
 
+    @ijik.hookimpl
+    def ijik_plugin_stop(self):
+        self.stop()
+
+    # writes out the queued records
+    def stop(self):
+        listener, self.listener = self.listener, None
+        if listener is not None:
+            listener.stop()
+
     @ijik.hookimpl
     def ijik_plugin_init(self, app):
         self.pluginmanager = app.pluginmanager
@@ -4,8 +4,9 @@ from typing import List, Optional
 import fastapi
 from fastapi.responses import JSONResponse
 import pydantic
-from sqlalchemy.ext.associationproxy import _AssociationList
-from sqlalchemy.orm import Session
+import sqlalchemy as sa
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 
 import ijik
 from ijik.helpers import abort, escape, filter_none, loc_validator, partial
@@ -32,12 +33,6 @@ class EditorMemberInfo(EditorMemberProps, pydantic.BaseModel):
 class EditorTeamMembers(pydantic.BaseModel):
     member_ids: List[int]
 
-    @pydantic.validator("member_ids", pre=True)
-    def assoclist_to_list(cls, v):
-        if isinstance(v, _AssociationList):
-            v = list(v)
-        return v
-
 class MembersPlugin:
 
     @ijik.hookimpl
@@ -70,60 +65,128 @@ class MembersPlugin:
         async def new_member(
                 schema: NewMember,
                 user: ijik.Registrant = fastapi.Depends(editor.get_auth),
-                db: Session = fastapi.Depends(self.sessionmanager.get_session)
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
+            ):
+
+            def create(db):
+                member = ijik.Member(registrant=user, **schema.dict())
+                self.entitymanager.session(db).add(member)
+                return MemberInfo.from_orm(member)
+
+            return await db.run_sync(create)
+
+        # batch versions of the routes below, in one transaction. errors are keyed by the
+        # index of the item in the request.
+        # (these must come before the /members/{id} routes)
+
+        UpdateMemberItem = pydantic.create_model("UpdateMemberItem", __base__=UpdateMember, id=(int, ...))
+
+        def get_members(db, user, ids):
+            members = dict((x.id, x) for x in db.query(ijik.Member)
+                    .filter(ijik.Member.id.in_(ids), ijik.Member.registrant_id == user.id))
+            if len(members) != len(set(ids)):
+                abort(404)
+            return members
+
+        @router.post("/members/batch", response_model=List[MemberInfo])
+        async def new_members(
+                schemas: List[NewMember],
+                user: ijik.Registrant = fastapi.Depends(editor.get_auth),
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
+            ):
+
+            def create(db):
+                members = [ijik.Member(registrant=user, **schema.dict()) for schema in schemas]
+                self.entitymanager.session(db).add_all(members)
+                return [MemberInfo.from_orm(member) for member in members]
+
+            return await db.run_sync(create)
+
+        @router.patch("/members/batch", response_model=List[MemberInfo])
+        async def update_members(
+                schemas: List[UpdateMemberItem],
+                user: ijik.Registrant = fastapi.Depends(editor.get_auth),
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
+            ):
+
+            def update(db):
+                members = get_members(db, user, [schema.id for schema in schemas])
+                self.entitymanager.session(db).update_all([
+                    (members[schema.id], filter_none(schema.dict(exclude={"id"})))
+                    for schema in schemas
+                ])
+                return [MemberInfo.from_orm(members[schema.id]) for schema in schemas]
+
+            return await db.run_sync(update)
+
+        @router.delete("/members/batch")
+        async def delete_members(
+                id: List[int] = fastapi.Query(...),
+                user: ijik.Registrant = fastapi.Depends(editor.get_auth),
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
             ):
 
-            member = ijik.Member(registrant=user, **schema.dict())
-            self.entitymanager.session(db).add(member)
-            return MemberInfo.from_orm(member)
+            members = await db.run_sync(lambda db: get_members(db, user, id))
+            await self.entitymanager.async_session(db).delete_all(list(members.values()))
 
         @router.patch("/members/{id}", response_model=MemberInfo)
         async def update_member(
                 id: int,
                 schema: UpdateMember,
                 user: ijik.Registrant = fastapi.Depends(editor.get_auth),
-                db: Session = fastapi.Depends(self.sessionmanager.get_session)
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
             ):
 
-            member = db.query(ijik.Member).filter_by(id=id, registrant_id=user.id).one_or_none() or abort(404)
-            self.entitymanager.session(db).update(member, **filter_none(schema.dict()))
-            return MemberInfo.from_orm(member)
+            def update(db):
+                member = db.query(ijik.Member).filter_by(id=id, registrant_id=user.id).one_or_none() or abort(404)
+                self.entitymanager.session(db).update(member, **filter_none(schema.dict()))
+                return MemberInfo.from_orm(member)
+
+            return await db.run_sync(update)
 
         @router.delete("/members/{id}")
         async def delete_member(
                 id: int,
                 user: ijik.Registrant = fastapi.Depends(editor.get_auth),
-                db: Session = fastapi.Depends(self.sessionmanager.get_session)
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
             ):
 
-            member = db.query(ijik.Member).filter_by(id=id, registrant_id=user.id).one_or_none() or abort(404)
-            self.entitymanager.session(db).delete(member)
+            member = await db.run_sync(
+                    lambda db: db.query(ijik.Member).filter_by(id=id, registrant_id=user.id).one_or_none()
+            ) or abort(404)
+            await self.entitymanager.async_session(db).delete(member)
 
     @ijik.hookimpl
     def ijik_monitor_setup(self, monitor, router):
         hoverlist_template = self.templates.get_template("monitor/hoverlist.html")
 
-        @monitor.field("Member", name="Id", prio=-1000, html=False)
+        @monitor.field("Member", name="Id", prio=-1000, html=False, sql=ijik.Member.id,
+                searchable=False)
         def id(member):
             return member.id
 
-        @monitor.field("Member", name="Sukunimi", prio=-100)
+        @monitor.field("Member", name="Sukunimi", prio=-100, sql=ijik.Member.last_name)
         def last_name(member):
             return member.last_name
 
-        @monitor.field("Member", name="Etunimi", prio=-99)
+        @monitor.field("Member", name="Etunimi", prio=-99, sql=ijik.Member.first_name)
         def first_name(member):
             return member.first_name
 
-        @monitor.field("Member", name="Ilmoittaja Id", prio=-999, html=False)
+        @monitor.field("Member", name="Ilmoittaja Id", prio=-999, html=False,
+                sql=ijik.Member.registrant_id, searchable=False)
         def registrant_id(member):
             return member.registrant_id
 
-        @monitor.field("Member", name="Ilmoittaja")
+        @monitor.field("Member", name="Ilmoittaja", load=joinedload(ijik.Member.registrant),
+                sql=ijik.Registrant.name, join=ijik.Member.registrant)
         def registrant(member):
             return member.registrant.name
 
-        @monitor.field("Member", name="Joukkueet")
+        member_teams = selectinload(ijik.Member.teams_assoc).joinedload(ijik.TeamMember.team)
+        team_members = selectinload(ijik.Team.members_assoc).joinedload(ijik.TeamMember.member)
+
+        @monitor.field("Member", name="Joukkueet", load=member_teams)
         def teams(member):
             return ",".join(str(t.id) for t in member.teams)
 
@@ -131,11 +194,11 @@ class MembersPlugin:
         def teams(member):
             return hoverlist_template.render({ "items": [t.name for t in member.teams] })
 
-        @monitor.field("Member", name="Joukkueiden nimet", html=False)
+        @monitor.field("Member", name="Joukkueiden nimet", html=False, load=member_teams)
         def team_names(member):
             return ",".join(escape(t.name, ",") for t in member.teams)
 
-        @monitor.field("Team", name="Jäsenet")
+        @monitor.field("Team", name="Jäsenet", load=team_members)
         def members(team):
             return ",".join(str(m.id) for m in team.members)
 
@@ -143,15 +206,57 @@ class MembersPlugin:
         def members(team):
             return hoverlist_template.render({ "items": [m.name for m in team.members] })
 
-        @monitor.field("Team", name="Jäsenten nimet", html=False)
+        @monitor.field("Team", name="Jäsenten nimet", html=False, load=team_members)
         def member_names(team):
             return ",".join(escape(m.name, ",") for m in team.members)
 
+# a team's members must be the registrant's own, checked after the changed associations
+# are flushed. (one query for the whole roster, also catches ids that don't exist.)
+def check_team_members(db, team):
+    tm = ijik.TeamMember.__table__
+    m = ijik.Member.__table__
+
+    foreign = (sa.select(tm.c.member_id)
+            .select_from(tm.outerjoin(m, m.c.id == tm.c.member_id))
+            .where(
+                tm.c.team_id == team.id,
+                sa.or_(m.c.id == None, m.c.registrant_id != team.registrant_id)
+            ))
+
+    if db.execute(sa.select(foreign.exists())).scalar():
+        return ijik.Errors({"member_ids": "Tuntematon jäsen"})
+
 class EditorMemberHooksPlugin:
 
     def __init__(self, *, MemberInfo):
         self.MemberInfo = MemberInfo
 
+    @ijik.hookimpl
+    def ijik_editor_load_options(self):
+        return [
+            selectinload(ijik.Registrant.members),
+            # EditorTeamMembers.member_ids
+            selectinload(ijik.Registrant.teams).selectinload(ijik.Team.members_assoc)
+        ]
+
+    @ijik.hookimpl
+    @ijik.entity_hook("Team")
+    def ijik_add_entity(self, team, db):
+        if not team.members_assoc:
+            return
+
+        yield
+        yield check_team_members(db, team)
+
+    @ijik.hookimpl
+    @ijik.entity_hook("Team")
+    def ijik_update_entity(self, team, db, kwargs):
+        if "member_ids" not in kwargs:
+            return
+
+        yield
+        yield check_team_members(db, team)
+
     @ijik.hookimpl
     def ijik_editor_render(self, registrant, template):
         members = [self.MemberInfo.from_orm(member).dict() for member in registrant.members]
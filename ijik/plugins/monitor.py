@@ -1,5 +1,7 @@
+from typing import List, Optional
+
 import fastapi
-from fastapi.responses import HTMLResponse, Response
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
 from sqlalchemy.orm import Session
 
 import ijik
@@ -33,9 +35,54 @@ class MonitorPlugin:
         self.monitor.setup(router)
         self.api.include_router(router, prefix="/monitor/{key}")
 
+    # ---- cache invalidation ----------------------------------------
+
+    @ijik.hookimpl
+    def ijik_add_entity(self):
+        yield
+        yield
+        self.monitor.cache.invalidate()
+
+    @ijik.hookimpl
+    def ijik_update_entity(self):
+        yield
+        yield
+        self.monitor.cache.invalidate()
+
+    @ijik.hookimpl
+    def ijik_delete_entity(self):
+        yield
+        yield
+        self.monitor.cache.invalidate()
+
+    # ----------------------------------------
+
     @ijik.hookimpl(trylast=True)
     def ijik_monitor_setup(self, monitor, router):
 
+        # no-cache makes the browser revalidate with If-None-Match every time,
+        # which we can answer with a 304 without touching the database
+        def not_modified(request, cache_key):
+            etag = monitor.cache.etag(cache_key)
+            headers = { "ETag": etag, "Cache-Control": "no-cache" }
+
+            if etag in request.headers.get("if-none-match", ""):
+                return Response(status_code=304, headers=headers), headers
+
+            return None, headers
+
+        def cached(request, cache_key, render):
+            response, headers = not_modified(request, cache_key)
+            if response:
+                return response
+
+            content = monitor.cache.get(cache_key, render)
+            if content is None:
+                raise fastapi.HTTPException(404)
+
+            media_type, content = content
+            return Response(media_type=media_type, content=content, headers=headers)
+
         @router.get("/", response_class=HTMLResponse)
         async def index(
                 key: str,
@@ -47,20 +94,67 @@ class MonitorPlugin:
             if view is None:
                 raise fastapi.HTTPException(404)
 
-            return view.render(request=request)
+            return cached(request, (key, None, "html"),
+                    lambda: ("text/html", view.render(request=request)))
+
+        @router.get("/table/{id}")
+        async def table_page(
+                key: str,
+                id: str,
+                offset: int = fastapi.Query(0, ge=0),
+                limit: int = fastapi.Query(100, ge=1, le=1000),
+                format: str = fastapi.Query("html", regex="^(html|json)$"),
+                sort: Optional[str] = None,
+                search: Optional[str] = None,
+                filter: List[str] = fastapi.Query([], description="column=value"),
+                request: fastapi.Request = None,
+                db: Session = fastapi.Depends(self.sessionmanager.get_session)
+            ):
+
+            view = monitor.view(db, key)
+            if view is None:
+                raise fastapi.HTTPException(404)
+
+            filters = dict(f.split("=", 1) for f in filter if "=" in f)
+
+            return cached(request,
+                    (key, id, format, offset, limit, sort, search, tuple(sorted(filters.items()))),
+                    lambda: view.get_page(id,
+                        offset = offset,
+                        limit = limit,
+                        format = format,
+                        sort = sort,
+                        search = search,
+                        filters = filters
+                    )
+            )
 
         @router.get("/download/{id}")
         async def download(
                 key: str,
                 id: str,
+                request: fastapi.Request,
                 db: Session = fastapi.Depends(self.sessionmanager.get_session)
             ):
 
-            # TODO: if content is iterator/async iterator, return a StreamingResponse
+            view = monitor.view(db, key)
+            if view is None:
+                raise fastapi.HTTPException(404)
+
+            # downloads are streamed, so only the etag is used here
+            response, headers = not_modified(request, (key, id, "download"))
+            if response:
+                return response
 
-            dl = monitor.view(db, key).get_download(id)
+            dl = view.get_download(id)
             if not dl:
                 raise fastapi.HTTPException(404)
 
             media_type, content = dl
-            return Response(media_type=media_type, content=content)
+
+            # note: the session stays open until the response is sent, so the iterator
+            # can keep querying
+            if isinstance(content, (str, bytes)):
+                return Response(media_type=media_type, content=content, headers=headers)
+
+            return StreamingResponse(content, media_type=media_type, headers=headers)
@@ -2,7 +2,7 @@ import json
 
 import fastapi
 import pydantic
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import ijik
 from ijik.helpers import filter_none, partial
@@ -41,21 +41,25 @@ class RegistrantsPlugin:
         async def update_user(
                 schema: UpdateUser,
                 user: ijik.Registrant = fastapi.Depends(editor.get_auth),
-                db: Session = fastapi.Depends(self.sessionmanager.get_session)
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
             ):
 
-            self.entitymanager.session(db).update(user, **filter_none(schema.dict()))
-            return UserInfo.from_orm(user)
+            def update(db):
+                self.entitymanager.session(db).update(user, **filter_none(schema.dict()))
+                return UserInfo.from_orm(user)
+
+            return await db.run_sync(update)
 
     @ijik.hookimpl
     def ijik_monitor_setup(self, monitor, router):
         hide_template = self.templates.get_template("monitor/hide.html")
 
-        @monitor.field("Registrant", name="Id", prio=-1000, html=False)
+        @monitor.field("Registrant", name="Id", prio=-1000, html=False, sql=ijik.Registrant.id,
+                searchable=False)
         def id(registrant):
             return registrant.id
 
-        @monitor.field("Registrant", name="Nimi", prio=-100)
+        @monitor.field("Registrant", name="Nimi", prio=-100, sql=ijik.Registrant.name)
         def name(registrant):
             return registrant.name
 
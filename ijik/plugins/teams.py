@@ -1,9 +1,10 @@
 import json
-from typing import Optional
+from typing import List, Optional
 
 import fastapi
 import pydantic
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
 
 import ijik
 from ijik.helpers import abort, filter_none, partial
@@ -46,51 +47,115 @@ class TeamsPlugin:
         async def new_team(
                 schema: NewTeam,
                 user: ijik.Registrant = fastapi.Depends(editor.get_auth),
-                db: Session = fastapi.Depends(self.sessionmanager.get_session)
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
             ):
 
-            team = ijik.Team(registrant=user, **schema.dict())
-            self.entitymanager.session(db).add(team)
-            return TeamInfo.from_orm(team)
+            def create(db):
+                team = ijik.Team(registrant=user, **schema.dict())
+                self.entitymanager.session(db).add(team)
+                return TeamInfo.from_orm(team)
+
+            return await db.run_sync(create)
+
+        # batch versions of the routes below, in one transaction. errors are keyed by the
+        # index of the item in the request.
+        # (these must come before the /teams/{id} routes)
+
+        UpdateTeamItem = pydantic.create_model("UpdateTeamItem", __base__=UpdateTeam, id=(int, ...))
+
+        def get_teams(db, user, ids):
+            teams = dict((x.id, x) for x in db.query(ijik.Team)
+                    .filter(ijik.Team.id.in_(ids), ijik.Team.registrant_id == user.id))
+            if len(teams) != len(set(ids)):
+                abort(404)
+            return teams
+
+        @router.post("/teams/batch", response_model=List[TeamInfo])
+        async def new_teams(
+                schemas: List[NewTeam],
+                user: ijik.Registrant = fastapi.Depends(editor.get_auth),
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
+            ):
+
+            def create(db):
+                teams = [ijik.Team(registrant=user, **schema.dict()) for schema in schemas]
+                self.entitymanager.session(db).add_all(teams)
+                return [TeamInfo.from_orm(team) for team in teams]
+
+            return await db.run_sync(create)
+
+        @router.patch("/teams/batch", response_model=List[TeamInfo])
+        async def update_teams(
+                schemas: List[UpdateTeamItem],
+                user: ijik.Registrant = fastapi.Depends(editor.get_auth),
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
+            ):
+
+            def update(db):
+                teams = get_teams(db, user, [schema.id for schema in schemas])
+                self.entitymanager.session(db).update_all([
+                    (teams[schema.id], filter_none(schema.dict(exclude={"id"})))
+                    for schema in schemas
+                ])
+                return [TeamInfo.from_orm(teams[schema.id]) for schema in schemas]
+
+            return await db.run_sync(update)
+
+        @router.delete("/teams/batch")
+        async def delete_teams(
+                id: List[int] = fastapi.Query(...),
+                user: ijik.Registrant = fastapi.Depends(editor.get_auth),
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
+            ):
+
+            teams = await db.run_sync(lambda db: get_teams(db, user, id))
+            await self.entitymanager.async_session(db).delete_all(list(teams.values()))
 
         @router.patch("/teams/{id}", response_model=TeamInfo)
         async def update_team(
                 id: int,
                 schema: UpdateTeam,
                 user: ijik.Registrant = fastapi.Depends(editor.get_auth),
-                db: Session = fastapi.Depends(self.sessionmanager.get_session)
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
             ):
 
-            team = db.query(ijik.Team).filter_by(id=id, registrant_id=user.id).one_or_none() or abort(404)
-            self.entitymanager.session(db).update(team, **filter_none(schema.dict()))
-            return TeamInfo.from_orm(team)
+            def update(db):
+                team = db.query(ijik.Team).filter_by(id=id, registrant_id=user.id).one_or_none() or abort(404)
+                self.entitymanager.session(db).update(team, **filter_none(schema.dict()))
+                return TeamInfo.from_orm(team)
+
+            return await db.run_sync(update)
 
         @router.delete("/teams/{id}")
         async def delete_team(
                 id: int,
                 user: ijik.Registrant = fastapi.Depends(editor.get_auth),
-                db: Session = fastapi.Depends(self.sessionmanager.get_session)
+                db: AsyncSession = fastapi.Depends(self.sessionmanager.get_async_session)
             ):
 
-            team = db.query(ijik.Team).filter_by(id=id, registrant_id=user.id).one_or_none() or abort(404)
-            self.entitymanager.session(db).delete(team)
+            team = await db.run_sync(
+                    lambda db: db.query(ijik.Team).filter_by(id=id, registrant_id=user.id).one_or_none()
+            ) or abort(404)
+            await self.entitymanager.async_session(db).delete(team)
 
     @ijik.hookimpl
     def ijik_monitor_setup(self, monitor):
 
-        @monitor.field("Team", name="Id", prio=-1000, html=False)
+        @monitor.field("Team", name="Id", prio=-1000, html=False, sql=ijik.Team.id, searchable=False)
         def id(team):
             return team.id
 
-        @monitor.field("Team", name="Ilmoittaja Id", prio=-999, html=False)
+        @monitor.field("Team", name="Ilmoittaja Id", prio=-999, html=False,
+                sql=ijik.Team.registrant_id, searchable=False)
         def registrant_id(team):
             return team.registrant_id
 
-        @monitor.field("Team", name="Nimi", prio=-100)
+        @monitor.field("Team", name="Nimi", prio=-100, sql=ijik.Team.name)
         def name(team):
             return team.name
 
-        @monitor.field("Team", name="Ilmoittaja")
+        @monitor.field("Team", name="Ilmoittaja", load=joinedload(ijik.Team.registrant),
+                sql=ijik.Registrant.name, join=ijik.Team.registrant)
         def registrant(team):
             return team.registrant.name
 
@@ -99,6 +164,10 @@ class EditorTeamHooksPlugin:
     def __init__(self, *, TeamInfo):
         self.TeamInfo = TeamInfo
 
+    @ijik.hookimpl
+    def ijik_editor_load_options(self):
+        return [ selectinload(ijik.Registrant.teams) ]
+
     @ijik.hookimpl
     def ijik_editor_render(self, registrant, template):
         teams = [self.TeamInfo.from_orm(team).dict() for team in registrant.teams]
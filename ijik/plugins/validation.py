@@ -1,11 +1,17 @@
 import ijik
+from ijik.validation import default_aggregates
 
 __all__ = ["ValidationPlugin"]
 
 class EntityValidatorPlugin:
 
-    def __init__(self, validator):
+    def __init__(self, validator, aggregates):
         self.validator = validator
+        self.kwargs = { "aggregates": aggregates } if validator.aggregates else {}
+
+    @ijik.hookimpl
+    def ijik_db_indexes(self):
+        return self.validator.get_indexes()
 
     @ijik.hookimpl
     def ijik_add_entity(self, entity, db):
@@ -14,7 +20,7 @@ class EntityValidatorPlugin:
             return
 
         yield
-        yield validator(entity, db=db, is_new=True)
+        yield validator(entity, db=db, is_new=True, **self.kwargs)
 
     @ijik.hookimpl
     def ijik_update_entity(self, entity, db):
@@ -23,14 +29,17 @@ class EntityValidatorPlugin:
             return
 
         yield
-        yield validator(entity, db=db, is_new=False)
+        yield validator(entity, db=db, is_new=False, **self.kwargs)
 
 class ValidationPlugin:
 
-    def __init__(self, *, entity_validators=()):
+    def __init__(self, *, entity_validators=(), aggregates=None):
         self.entity_validators = entity_validators
+        self.aggregates = aggregates if aggregates is not None else default_aggregates()
 
     @ijik.hookimpl
     def ijik_plugin_init(self, app):
         for ev in self.entity_validators:
-            app.pluginmanager.register(EntityValidatorPlugin(ev))
+            for entity, names in ev.aggregates.items():
+                self.aggregates.need(entity, names)
+            app.pluginmanager.register(EntityValidatorPlugin(ev, self.aggregates))
@@ -3,7 +3,7 @@ import json
 import fastapi
 
 import ijik
-from ijik.webhooks import Hooks
+from ijik.webhooks import Dispatcher, Hooks, QueueFull
 
 __all__ = ["WebhooksPlugin"]
 
@@ -22,18 +22,21 @@ class UserWebhookPlugin:
     def __init__(self, webhook):
         self.webhook = webhook
 
-    @ijik.hookimpl
-    def ijik_plugin_init(self, app):
-        self.pluginmanager = app.pluginmanager
-
+    # the webhook runs in the dispatcher, the response only tells where to poll for it
     @ijik.hookimpl
     def ijik_editor_setup(self, editor, router):
 
-        @router.post(self.webhook.endpoint)
+        @router.post(self.webhook.endpoint, status_code=202)
         async def user_webhook(
+            request: fastapi.Request,
             user: ijik.Registrant = fastapi.Depends(editor.get_auth)
         ):
-            self.pluginmanager.hook.ijik_webhook(id=self.webhook.id, kwargs={"registrant": user})
+            try:
+                job = self.dispatcher.submit(self.webhook, user.id)
+            except QueueFull:
+                raise fastapi.HTTPException(503, headers={"Retry-After": "10"})
+
+            return { **job.dict(), "url": str(request.url_for("webhook_job", job=job.id)) }
 
     @ijik.hookimpl
     def ijik_editor_render(self, template):
@@ -41,11 +44,32 @@ class UserWebhookPlugin:
 
 class WebhooksPlugin:
 
-    def __init__(self, webhooks):
+    def __init__(self, webhooks, **dispatcher_config):
         self.webhooks = [webhook_plugins[w.plugin](w) for w in webhooks]
+        self.dispatcher_config = dispatcher_config
 
     @ijik.hookimpl
     def ijik_plugin_init(self, app):
         app.pluginmanager.add_hookspecs(Hooks)
+        self.dispatcher = Dispatcher(app.pluginmanager, app.sessionmanager, **self.dispatcher_config)
         for w in self.webhooks:
+            w.dispatcher = self.dispatcher
             app.pluginmanager.register(w)
+
+    @ijik.hookimpl
+    def ijik_plugin_stop(self):
+        self.dispatcher.shutdown()
+
+    @ijik.hookimpl
+    def ijik_editor_setup(self, editor, router):
+
+        @router.get("/webhooks/jobs/{job}", name="webhook_job")
+        async def webhook_job(
+            job: str,
+            user: ijik.Registrant = fastapi.Depends(editor.get_auth)
+        ):
+            j = self.dispatcher.get(job)
+            if j is None or j.registrant_id != user.id:
+                raise fastapi.HTTPException(404)
+
+            return j.dict()
@@ -1,12 +1,108 @@
+import collections
+import sqlalchemy as sa
 import ijik
+from ijik.db import table_index
+
+# ---- Aggregates ----------------------------------------
+# aggregate values of an entity (eg. the member count of a team) for validators.
+# validators list the aggregates they use in `aggregates`, and the first one to ask for
+# an entity gets all of them in one query. the values are kept on the sqlalchemy session
+# until it flushes or the transaction ends.
+# an aggregate can also be read from the instance (eg. a collection that's already loaded),
+# then it's not queried at all.
+# each ValidationPlugin has its own registry (see default_aggregates), which it passes to
+# the validators that use aggregates.
+
+class Aggregates:
+
+    def __init__(self):
+        self.defs = {}
+        self.needed = collections.defaultdict(set)
+
+    # `query(id)` returns a select of the value, `state(entity)` the value or None
+    def define(self, entity, name, query, state=None):
+        self.defs[entity, name] = (query, state)
+
+    def need(self, entity, names):
+        self.needed[entity].update(names)
+
+    def get(self, db, entity, name):
+        cache = db.info.setdefault("ijik.aggregates", {})
+        key = (self, entity.__class__.__name__, entity.id)
+
+        try:
+            values = cache[key]
+        except KeyError:
+            values = cache[key] = self.fetch(db, entity)
+
+        if name not in values:
+            values.update(self.fetch(db, entity, (name, )))
+
+        return values[name]
+
+    def fetch(self, db, entity, names=None):
+        cls = entity.__class__.__name__
+        values = {}
+        query = []
+
+        for name in (names or self.needed[cls]):
+            q, state = self.defs[cls, name]
+            value = state(entity) if state else None
+            if value is None:
+                query.append(q(entity.id).scalar_subquery().label(name))
+            else:
+                values[name] = value
+
+        if query:
+            values.update(db.execute(sa.select(*query)).one()._mapping)
+
+        return values
+
+def _clear_aggregates(db, *args):
+    db.info.pop("ijik.aggregates", None)
+
+sa.event.listen(sa.orm.Session, "after_flush", _clear_aggregates)
+sa.event.listen(sa.orm.Session, "after_transaction_end", _clear_aggregates)
+
+def loaded_len(attr):
+    def state(entity):
+        collection = entity.__dict__.get(attr)
+        return None if collection is None else len(collection)
+    return state
+
+def default_aggregates():
+    aggregates = Aggregates()
+
+    aggregates.define("Team", "members",
+            query = lambda id: (sa.select(sa.func.count())
+                .select_from(ijik.TeamMember.__table__)
+                .where(ijik.TeamMember.__table__.c.team_id == id)),
+            state = loaded_len("members_assoc")
+    )
+
+    return aggregates
+
+# ---- Validators ----------------------------------------
 
 class EntityValidator:
 
+    # entity name -> aggregate names, see Aggregates. validators that list any get the
+    # registry as an `aggregates` argument.
+    aggregates = {}
+
     def get_validator(self, entity):
         return getattr(self, f"validate_{entity.__class__.__name__.lower()}", None)
 
+    # indexes the validator's queries need, see Hooks.ijik_db_indexes
+    def get_indexes(self):
+        return ()
+
 class UniqueMembers(EntityValidator):
 
+    def get_indexes(self):
+        return [table_index(ijik.Member.__table__, "ix_members_registrant_id_name",
+            "registrant_id", "last_name", "first_name")]
+
     def validate_member(self, member, db, is_new):
         query = db.query(ijik.Member).filter(
                 ijik.Member.registrant_id == member.registrant_id,
@@ -20,6 +116,9 @@ class UniqueMembers(EntityValidator):
 
 class UniqueTeams(EntityValidator):
 
+    def get_indexes(self):
+        return [table_index(ijik.Team.__table__, "ix_teams_name_category", "name", "category")]
+
     # this will work even if category/eventid plugins aren't used,
     # but it would be nicer to modularize this so that they won't appear in the query
     # unless enabled.
@@ -38,19 +137,21 @@ class UniqueTeams(EntityValidator):
 
 class TeamSize(EntityValidator):
 
+    aggregates = { "Team": ("members", ) }
+
     def __init__(self, get_limits):
         self.get_limits = get_limits
 
-    def validate_team(self, team, db, is_new):
+    def validate_team(self, team, db, is_new, aggregates):
         limit = self.get_limits(team)
-        print(limit)
         if not limit:
             return
 
         m, M = limit
+        n = aggregates.get(db, team, "members")
 
-        if m is not None and len(team.member_ids) < m:
+        if m is not None and n < m:
             return ijik.Errors({"members": f"Joukkueessa on oltava vähintään {m} jäsentä"})
 
-        if M is not None and len(team.member_ids) > M:
+        if M is not None and n > M:
             return ijik.Errors({"members": f"Joukkueessa saa olla korkeintaan {M} jäsentä"})
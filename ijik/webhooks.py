@@ -1,6 +1,11 @@
+import collections
+from concurrent.futures import ThreadPoolExecutor
 import inspect
+import threading
+import uuid
 import pydantic
 import ijik
+from ijik.cache import TTLCache
 
 def webhook(id):
     def deco(f):
@@ -26,12 +31,13 @@ class UserWebhook:
 
     plugin = "user"
 
-    def __init__(self, id, name=None, desc=None, endpoint=None, success=None):
+    def __init__(self, id, name=None, desc=None, endpoint=None, success=None, concurrency=1):
         self.id = id
         self.name = name or id
         self.desc = desc or ""
         self.endpoint = endpoint or f"/webhooks/{id}"
         self.success = success
+        self.concurrency = concurrency
 
     def dict(self):
         return {
@@ -40,3 +46,104 @@ class UserWebhook:
             "endpoint": self.endpoint,
             "successText": self.success
         }
+
+# ---- Dispatch ----------------------------------------
+
+class QueueFull(Exception):
+    pass
+
+class Job:
+
+    def __init__(self, webhook, registrant_id):
+        self.id = uuid.uuid4().hex
+        self.webhook = webhook
+        self.registrant_id = registrant_id
+        self.status = "pending"
+
+    def dict(self):
+        return {
+            "id": self.id,
+            "webhook": self.webhook.id,
+            "status": self.status
+        }
+
+# runs webhook invocations outside of requests in a bounded thread pool.
+# each webhook runs at most `webhook.concurrency` jobs at once, the rest wait in its queue.
+# a registrant's repeated invocation of a webhook returns the already queued or running job.
+# finished jobs are kept around for `keep` seconds for status queries.
+class Dispatcher:
+
+    def __init__(self, pluginmanager, sessionmanager, *,
+            max_workers=4,
+            max_pending=100,
+            keep=600
+        ):
+
+        self.pluginmanager = pluginmanager
+        self.sessionmanager = sessionmanager
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="ijik-webhook")
+        self.lock = threading.Lock()
+        self.jobs = TTLCache(maxsize=10000, ttl=keep)
+        self.pending = {} # (webhook, registrant) -> queued or running job
+        self.queues = collections.defaultdict(collections.deque)
+        self.running = collections.Counter()
+
+    def submit(self, webhook, registrant_id):
+        with self.lock:
+            job = self.pending.get((webhook.id, registrant_id))
+            if job is not None:
+                return job
+
+            if len(self.pending) >= self.max_pending:
+                raise QueueFull()
+
+            job = Job(webhook, registrant_id)
+            self.pending[webhook.id, registrant_id] = job
+            self.jobs.set(job.id, job)
+
+            if self.running[webhook.id] < webhook.concurrency:
+                self._start(job)
+            else:
+                self.queues[webhook.id].append(job)
+
+        return job
+
+    def get(self, id):
+        return self.jobs.get(id)
+
+    def shutdown(self):
+        self.executor.shutdown(cancel_futures=True)
+
+    # called with the lock held
+    def _start(self, job):
+        self.running[job.webhook.id] += 1
+        self.executor.submit(self._run, job)
+
+    def _run(self, job):
+        with self.lock:
+            job.status = "running"
+
+        status = "failed"
+        try:
+            with self.sessionmanager.Session() as db:
+                registrant = db.get(ijik.Registrant, job.registrant_id)
+                if registrant is None:
+                    raise LookupError(f"Registrant {job.registrant_id} was deleted")
+
+                self.pluginmanager.hook.ijik_webhook(
+                        id = job.webhook.id,
+                        kwargs = {"registrant": registrant}
+                )
+        except Exception as e:
+            self.pluginmanager.hook.ijik_uncaught_exception(exc=e)
+        else:
+            status = "done"
+        finally:
+            with self.lock:
+                job.status = status
+                del self.pending[job.webhook.id, job.registrant_id]
+                self.running[job.webhook.id] -= 1
+                queue = self.queues[job.webhook.id]
+                if queue:
+                    self._start(queue.popleft())
@@ -12,6 +12,10 @@ setup(
         "jinja2",
         "pluggy==1.0.0dev0",
         "python-multipart",
-        "sqlalchemy==1.4.0b1"
-    ]
+        "sqlalchemy==1.4.54"
+    ],
+    extras_require = {
+        "async": [ "aiosqlite" ],
+        "test": [ "aiosqlite", "httpx<0.28", "pytest" ]
+    }
 )
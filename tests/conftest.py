@@ -0,0 +1,154 @@
+import threading
+import pytest
+import sqlalchemy as sa
+from fastapi.testclient import TestClient
+import ijik
+from ijik.monitor import Table
+from smtpserver import start_smtp_server
+
+@pytest.fixture(scope="session")
+def smtp_server():
+    server = start_smtp_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+# sends a welcome email for each new registrant
+class SignupMailer(ijik.TemplateMailerMixin):
+
+    @ijik.hookimpl
+    @ijik.entity_hook("Registrant")
+    def ijik_add_entity(self, registrant, db):
+        yield
+        self.send(db=db, to_addr=f"{registrant.key}@example.com", to_name=registrant.name)
+
+monitor_keys = ijik.KeyRegistry()
+
+@monitor_keys.view("secret")
+def monitor_view(db):
+    return [
+        Table("Ilmoittautuneet", lambda: db.query(ijik.Registrant).order_by(ijik.Registrant.id)),
+        Table("Joukkueet", lambda: db.query(ijik.Team).order_by(ijik.Team.id)),
+        Table("Osallistujat", lambda: db.query(ijik.Member).order_by(ijik.Member.id))
+    ]
+
+# the model classes can only be mapped once per process, so all tests share one app.
+# it runs on the async driver, so the routes go through a real AsyncSession.
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory, smtp_server):
+    db_path = tmp_path_factory.mktemp("db") / "db.sqlite3"
+    template_path = tmp_path_factory.mktemp("templates")
+    (template_path / "email").mkdir()
+    (template_path / "email" / "base.txt").write_text("Hello {{ message.to_name }}")
+
+    smtp = ijik.SMTPLibSender("user", "password", host="127.0.0.1", port=smtp_server.server_address[1])
+    outbox = ijik.OutboxPlugin(smtp, backoff=0.1, max_attempts=2, poll_interval=0.1)
+
+    api = ijik.create_app(
+            db_path = str(db_path),
+            db_async_driver = "aiosqlite",
+            # the team/member associations are deleted by ON DELETE CASCADE (passive_deletes)
+            db_profile = ijik.SQLiteProfile(pragmas={"foreign_keys": "ON"}),
+            template_paths = [ str(template_path) ],
+            plugins = [
+                ijik.EditorPlugin(),
+                ijik.MembersPlugin(),
+                ijik.MonitorPlugin(monitor_keys),
+                ijik.ValidationPlugin(entity_validators=[
+                    ijik.UniqueMembers(),
+                    ijik.UniqueTeams(),
+                    ijik.TeamSize(lambda team: (None, 4))
+                ]),
+                outbox,
+                SignupMailer(sender=outbox)
+            ]
+    )
+
+    with TestClient(api):
+        yield api
+
+@pytest.fixture(scope="session")
+def ijik_app(app):
+    return app.state.ijik
+
+# a logged in client for a new registrant
+@pytest.fixture
+def signup(app):
+    n = 0
+
+    def signup(name=None):
+        nonlocal n
+        n += 1
+        client = TestClient(app)
+        r = client.post("/", data={"name": name or f"Ilmoittaja {n}"}, follow_redirects=False)
+        assert r.status_code == 303, r.text
+        return client
+
+    return signup
+
+# adds members for a logged in client, returns their ids
+@pytest.fixture
+def add_members():
+    def add_members(client, n, prefix="Jäsen"):
+        ids = []
+        for i in range(n):
+            r = client.post("/members/new", json={"first_name": f"{prefix} {i}", "last_name": "Suku"})
+            assert r.status_code == 200, r.text
+            ids.append(r.json()["id"])
+        return ids
+
+    return add_members
+
+# collects the statements run by the routes, on both engines (the monitor uses sync
+# sessions). the outbox worker's statements are left out.
+@pytest.fixture
+def statements(ijik_app):
+    out = []
+
+    def listen(conn, cursor, statement, *args):
+        if threading.current_thread().name != "ijik-outbox":
+            out.append(statement)
+
+    engines = [ ijik_app.sessionmanager.engine, ijik_app.sessionmanager.async_engine.sync_engine ]
+    for engine in engines:
+        sa.event.listen(engine, "before_cursor_execute", listen)
+    yield out
+    for engine in engines:
+        sa.event.remove(engine, "before_cursor_execute", listen)
+
+@pytest.fixture(scope="session")
+def monitor(ijik_app):
+    return next(p for p in ijik_app.pluginmanager.get_plugins()
+            if isinstance(p, ijik.MonitorPlugin)).monitor
+
+@pytest.fixture(scope="session")
+def outbox(ijik_app):
+    return next(p for p in ijik_app.pluginmanager.get_plugins() if isinstance(p, ijik.OutboxPlugin))
+
+# query_plans(f) runs f(db) and returns the query plan of each statement it ran.
+# (other connections are ignored, the outbox worker runs on the same engine.)
+@pytest.fixture
+def query_plans(ijik_app):
+    def query_plans(f):
+        statements = []
+        session_conn = None
+
+        def listen(conn, cursor, statement, parameters, *args):
+            if conn is session_conn:
+                statements.append((statement, parameters))
+
+        engine = ijik_app.sessionmanager.engine
+        sa.event.listen(engine, "before_cursor_execute", listen)
+        try:
+            with ijik_app.sessionmanager.Session() as db:
+                session_conn = db.connection()
+                f(db)
+        finally:
+            sa.event.remove(engine, "before_cursor_execute", listen)
+
+        with engine.connect() as conn:
+            return [ " ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {s}", p))
+                    for s, p in statements ]
+
+    return query_plans
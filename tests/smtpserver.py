@@ -0,0 +1,55 @@
+import socketserver
+import threading
+import time
+
+# a stand-in smtp server, keeps the received messages as (recipients, data).
+# `refuse` is a set of addresses answered with 550, `latency` is slept before each
+# reply (a round trip to a remote server).
+class SMTPHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        rcpt = []
+        self.reply("220 localhost")
+
+        while line := self.rfile.readline():
+            cmd = line.decode().split(" ")[0].strip().upper()
+
+            if cmd == "EHLO":
+                self.reply("250-localhost\r\n250 AUTH PLAIN")
+            elif cmd == "AUTH":
+                self.reply("235 ok")
+            elif cmd == "RCPT":
+                addr = line.decode().strip().split(":", 1)[1].strip("<>")
+                if addr in self.server.refuse:
+                    self.reply("550 no such user")
+                else:
+                    rcpt.append(addr)
+                    self.reply("250 ok")
+            elif cmd == "DATA":
+                self.reply("354 go ahead")
+                data = b"".join(iter(self.rfile.readline, b".\r\n"))
+                self.server.messages.append((rcpt, data.decode()))
+                rcpt = []
+                self.reply("250 ok")
+            elif cmd == "QUIT":
+                self.server.quits += 1
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+    def reply(self, s):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(s.encode() + b"\r\n")
+
+# starts the server in a thread, stop it with server.shutdown() and server.server_close()
+def start_smtp_server(latency=0):
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), SMTPHandler)
+    server.daemon_threads = True
+    server.messages = []
+    server.refuse = set()
+    server.quits = 0
+    server.latency = latency
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,45 @@
+import asyncio
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+import ijik
+
+def test_async_session(ijik_app):
+    async def get():
+        gen = ijik_app.sessionmanager.get_async_session()
+        session = await gen.__anext__()
+        await gen.aclose()
+        return session
+
+    assert isinstance(asyncio.run(get()), AsyncSession)
+
+def test_editor_roundtrip(signup):
+    client = signup()
+
+    r = client.post("/members/new", json={"first_name": "Etu", "last_name": "Suku"})
+    assert r.status_code == 200, r.text
+    member = r.json()["id"]
+
+    r = client.post("/teams/new", json={"name": "Joukkue", "member_ids": [member]})
+    assert r.status_code == 200, r.text
+    team = r.json()["id"]
+
+    r = client.patch(f"/teams/{team}", json={"name": "Uusi"})
+    assert r.status_code == 200, r.text
+    assert r.json()["member_ids"] == [member]
+
+    assert client.delete(f"/members/{member}").status_code == 200
+    assert client.delete(f"/teams/{team}").status_code == 200
+
+def test_concurrent_signups(app, ijik_app):
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/", data={"name": f"Rinnakkainen {i}"}) for i in range(20)
+            ))
+
+    assert all(r.status_code == 303 for r in asyncio.run(run()))
+
+    with ijik_app.sessionmanager.Session() as db:
+        n = db.query(ijik.Registrant).filter(ijik.Registrant.name.like("Rinnakkainen %")).count()
+    assert n == 20
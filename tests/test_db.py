@@ -0,0 +1,13 @@
+import ijik
+
+def test_profile_pragmas_not_shared():
+    pragmas = {"foreign_keys": "ON"}
+    a = ijik.SQLiteProfile(pragmas)
+    b = ijik.SQLiteProfile()
+    c = ijik.SQLiteProfile()
+
+    a.pragmas["journal_mode"] = "WAL"
+    b.pragmas["synchronous"] = "OFF"
+
+    assert pragmas == {"foreign_keys": "ON"}
+    assert c.pragmas == {}
@@ -0,0 +1,39 @@
+import ijik
+
+def page_statements(client, statements):
+    statements.clear()
+    r = client.get("/")
+    assert r.status_code == 200, r.text
+    return list(statements)
+
+# the editor page loads the registrant with everything it renders
+# (Editor.get_user(eager=True) with the ijik_editor_load_options), so the number of
+# statements doesn't depend on how many members and teams there are
+def test_editor_page_statements(signup, add_members, statements):
+    client = signup()
+    members = add_members(client, 1)
+    r = client.post("/teams/new", json={"name": "Sivu 1", "member_ids": members})
+    assert r.status_code == 200, r.text
+
+    small = page_statements(client, statements)
+
+    members += add_members(client, 12, prefix="Lisä")
+    for i, ids in enumerate((members[:4], members[4:8], members[8:12])):
+        r = client.post("/teams/new", json={"name": f"Sivu {i+2}", "member_ids": ids})
+        assert r.status_code == 200, r.text
+
+    large = page_statements(client, statements)
+
+    assert len(small) == len(large) <= 4, large
+
+# a registrant deleted by another process is still in this process's auth cache
+def test_deleted_elsewhere(ijik_app, signup, add_members):
+    client = signup("Poistettava")
+    add_members(client, 1)
+
+    with ijik_app.sessionmanager.Session() as db:
+        db.query(ijik.Registrant).filter_by(name="Poistettava").delete()
+        db.commit()
+
+    r = client.post("/members/new", json={"first_name": "Etu", "last_name": "Suku"})
+    assert r.status_code == 403
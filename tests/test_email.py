@@ -0,0 +1,66 @@
+import asyncio
+import smtplib
+import socket
+import pluggy
+import pytest
+import ijik
+
+def sender(port, **kwargs):
+    return ijik.PooledSMTPSender("user", "password", host="127.0.0.1", port=port, **kwargs)
+
+def test_send_all(smtp_server):
+    smtp_server.refuse.add("pool-refused@example.com")
+    messages = [ ijik.Message(to_addr=f"pool{i}@example.com", text="hi") for i in range(8) ]
+    messages[3] = ijik.Message(to_addr="pool-refused@example.com", text="hi")
+
+    errors = sender(smtp_server.server_address[1]).send_all(messages)
+
+    assert [ type(e) if e else None for e in errors ] == [
+            None, None, None, smtplib.SMTPRecipientsRefused, None, None, None, None ]
+    received = { addr for rcpt, _ in smtp_server.messages for addr in rcpt }
+    assert { f"pool{i}@example.com" for i in (0,1,2,4,5,6,7) } <= received
+
+def test_send_all_async(smtp_server):
+    messages = [ ijik.Message(to_addr=f"pool-async{i}@example.com", text="hi") for i in range(4) ]
+    errors = asyncio.run(sender(smtp_server.server_address[1]).send_all_async(messages))
+    assert errors == [None] * 4
+
+# connection errors aren't per message, they're raised like in TemplateMailerMixin.send_all
+def test_send_all_connection_error():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+
+    messages = [ ijik.Message(to_addr="nobody@example.com", text="hi") ]
+
+    with pytest.raises(ConnectionRefusedError):
+        sender(port).send_all(messages)
+
+    with pytest.raises(ConnectionRefusedError):
+        asyncio.run(sender(port).send_all_async(messages))
+
+class Mailer(ijik.TemplateMailerMixin):
+    pass
+
+def test_stop_closes_pool(ijik_app, smtp_server):
+    pluginmanager = pluggy.PluginManager("ijik")
+    pluginmanager.add_hookspecs(ijik.app.Hooks)
+
+    for plugin in (ijik.OutboxPlugin, Mailer):
+        pool = sender(smtp_server.server_address[1])
+        assert pool.send_all([ ijik.Message(to_addr="stop@example.com", text="hi") ]) == [None]
+        assert len(pool.idle) == 1
+
+        plugin = plugin(pool)
+        if isinstance(plugin, ijik.OutboxPlugin):
+            plugin.outbox = ijik.Outbox(ijik_app.sessionmanager, pool)
+        pluginmanager.register(plugin)
+
+        quits = smtp_server.quits
+        pluginmanager.hook.ijik_plugin_stop()
+        pluginmanager.unregister(plugin)
+
+        assert pool.idle == []
+        assert smtp_server.quits == quits + 1
+        with pytest.raises(RuntimeError):
+            pool.executor.submit(print)
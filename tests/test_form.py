@@ -0,0 +1,40 @@
+import itertools
+import pluggy
+import ijik
+from ijik.form import FormRenderer, Hooks
+
+def renderer(*plugins):
+    pluginmanager = pluggy.PluginManager("ijik")
+    pluginmanager.add_hookspecs(Hooks)
+    for plugin in plugins:
+        pluginmanager.register(plugin)
+    return FormRenderer(pluginmanager)
+
+# renders differently each time, like a field that depends on the request
+class Dynamic:
+
+    def __init__(self):
+        self.n = itertools.count()
+
+    @ijik.hookimpl
+    def ijik_render_html_field(self, field, value, errors):
+        return f"<input data-n='{next(self.n)}'>"
+
+class Compiled(Dynamic):
+
+    @ijik.hookimpl
+    def ijik_compile_html_field(self, field):
+        return lambda value, errors: self.ijik_render_html_field(field, value, errors)
+
+def test_fallback_not_cached():
+    form = renderer(Dynamic())
+    field = ijik.Field("name", str)
+
+    assert form.render_html(field=field) != form.render_html(field=field)
+
+def test_compiled_empty_cached():
+    form = renderer(Compiled())
+    field = ijik.Field("name", str)
+
+    assert form.render_html(field=field) == form.render_html(field=field)
+    assert form.render_html(field=field, value="x") != form.render_html(field=field, value="x")
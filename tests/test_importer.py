@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+import pytest
+import ijik
+from ijik import importer
+from ijik.importer import ImportCancelled, Importer, read_csv, read_jsonl
+
+def load(ijik_app, name):
+    with ijik_app.sessionmanager.Session() as db:
+        r = db.query(ijik.Registrant).filter_by(name=name).one_or_none()
+        if r is None:
+            return None
+        return {
+            "key": r.key,
+            "members": sorted((m.first_name, m.last_name) for m in r.members),
+            "teams": sorted((t.name, sorted(m.first_name for m in t.members)) for t in r.teams)
+        }
+
+JSONL = [
+    {"name": "Jsonl Koulu",
+     "members": [{"first_name": "A", "last_name": "Jsonl"}, {"first_name": "B", "last_name": "Jsonl"}],
+     "teams": [{"name": "Jsonl 1", "members": [0, 1]}]},
+    {"name": "Jsonl Seura", "key": "jsonl-key"}
+]
+
+@pytest.mark.parametrize("hooks", [False, True])
+def test_jsonl(ijik_app, hooks):
+    data = [ {**r, "name": f"{r['name']} {hooks}"} for r in JSONL ]
+    data[0]["teams"] = [ {**data[0]["teams"][0], "name": f"Jsonl {hooks}"} ]
+    data[1]["key"] = f"jsonl-key-{hooks}"
+    f = io.StringIO("\n".join(json.dumps(r) for r in data) + "\n\n")
+
+    keys = dict(Importer(ijik_app, hooks=hooks).run(read_jsonl(f)))
+
+    koulu = load(ijik_app, f"Jsonl Koulu {hooks}")
+    assert koulu == {
+        "key": keys[f"Jsonl Koulu {hooks}"],
+        "members": [("A", "Jsonl"), ("B", "Jsonl")],
+        "teams": [(f"Jsonl {hooks}", ["A", "B"])]
+    }
+    assert keys[f"Jsonl Seura {hooks}"] == f"jsonl-key-{hooks}"
+
+CSV = """registrant.name,member.first_name,member.last_name,member.attrs.luokka,team.name
+Csv Koulu,A,Csv,1,Csv 1
+Csv Koulu,B,Csv,2,Csv 1
+Csv Koulu,A,Csv,1,Csv 2
+Csv Seura,,,,
+"""
+
+def test_csv(ijik_app):
+    keys = dict(Importer(ijik_app).run(read_csv(io.StringIO(CSV))))
+
+    assert set(keys) == {"Csv Koulu", "Csv Seura"}
+    assert load(ijik_app, "Csv Koulu")["teams"] == [("Csv 1", ["A", "B"]), ("Csv 2", ["A"])]
+    assert load(ijik_app, "Csv Seura")["members"] == []
+
+    with ijik_app.sessionmanager.Session() as db:
+        member = db.query(ijik.Member).filter_by(last_name="Csv", first_name="B").one()
+        assert member.attrs == {"luokka": "2"}
+
+def test_csv_missing_column():
+    f = io.StringIO("registrant.name,member.first_name,member.last_name\nKoulu,A,B\n,C,D\nKoulu,E,\n")
+
+    with pytest.raises(ImportCancelled) as e:
+        list(read_csv(f))
+    assert e.value.errors == [("line 3", "missing registrant.name")]
+
+    f = io.StringIO("registrant.name,member.first_name,member.last_name\nKoulu,E,\n")
+    with pytest.raises(ImportCancelled, match="line 2: missing member.last_name"):
+        list(read_csv(f))
+
+# UniqueMembers fails the second member, nothing of the batch is kept
+def test_validation_rolls_back(ijik_app):
+    data = [
+        {"name": "Rollback 1", "members": [{"first_name": "A", "last_name": "Rollback"}]},
+        {"name": "Rollback 2", "members": [
+            {"first_name": "A", "last_name": "Rollback"},
+            {"first_name": "A", "last_name": "Rollback"}
+        ]}
+    ]
+
+    with pytest.raises(ImportCancelled) as e:
+        list(Importer(ijik_app, hooks=True).run(data))
+
+    where = [w for w, _ in e.value.errors]
+    assert where == ["registrant Rollback 2, member 0", "registrant Rollback 2, member 1"]
+    assert "name -> Tämän niminen osallistuja on jo ilmoitettu" in str(e.value)
+    assert e.value.cause.dict()[3] == {"name": {"_": ["Tämän niminen osallistuja on jo ilmoitettu"]}}
+
+    assert load(ijik_app, "Rollback 1") is None
+    assert load(ijik_app, "Rollback 2") is None
+
+def test_keys_file(ijik_app, tmp_path, monkeypatch):
+    monkeypatch.setattr(importer, "load_app", lambda spec: ijik_app)
+    inp = tmp_path / "registrants.csv"
+    inp.write_text("registrant.name,member.first_name,member.last_name\nAvain 1,A,Avain\nAvain 2,,\n")
+    keys = tmp_path / "keys.csv"
+
+    assert importer.main(["conf:app", str(inp), "--keys", str(keys)]) is None
+
+    with open(keys, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == ["name", "key"]
+    assert [name for name, _ in rows[1:]] == ["Avain 1", "Avain 2"]
+    assert all(load(ijik_app, name)["key"] == key for name, key in rows[1:])
+
+def test_cancelled_exit(ijik_app, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(importer, "load_app", lambda spec: ijik_app)
+    inp = tmp_path / "registrants.jsonl"
+    inp.write_text('{"name": "Ok"}\n{"members": []}\n')
+
+    assert importer.main(["conf:app", str(inp), "--batch-size", "1"]) == 1
+    assert "line 2: missing name" in capsys.readouterr().err
@@ -0,0 +1,24 @@
+import logging
+
+def updates(caplog):
+    return [ r.ijik["values"] for r in caplog.records
+            if getattr(r, "ijik", {}).get("op") == "Updated" ]
+
+def test_update_diff(signup, add_members, caplog):
+    client = signup()
+    members = add_members(client, 3)
+    r = client.post("/teams/new", json={"name": "Lokitettava", "member_ids": members[:2]})
+    assert r.status_code == 200, r.text
+    team = r.json()["id"]
+
+    caplog.set_level(logging.INFO, logger="ijik")
+
+    # unchanged roster, only the name is logged
+    r = client.patch(f"/teams/{team}", json={"name": "Lokitettu", "member_ids": members[:2]})
+    assert r.status_code == 200, r.text
+    assert updates(caplog) == [{"name": "Lokitettu"}]
+
+    caplog.clear()
+    r = client.patch(f"/teams/{team}", json={"member_ids": members})
+    assert r.status_code == 200, r.text
+    assert updates(caplog) == [{"member_ids": members}]
@@ -0,0 +1,71 @@
+from fastapi.testclient import TestClient
+import ijik
+from ijik.importer import Importer
+from ijik.monitor import Table
+
+def monitor_plans(query_plans, monitor, cls, **select):
+    def run(db):
+        table = Table("Test", lambda: db.query(cls).order_by(cls.id))
+        table.monitor = monitor
+        table.page_data(0, 100, **select)
+
+    return query_plans(run)
+
+# sorts and filters of the monitor's sql fields use the model indexes
+
+def test_sort_registrants(query_plans, monitor):
+    plans = monitor_plans(query_plans, monitor, ijik.Registrant, sort="Nimi")
+    assert "SCAN registrants USING INDEX ix_registrants_name" in plans[0]
+    assert "TEMP B-TREE" not in plans[0]
+
+def test_sort_members(query_plans, monitor):
+    plans = monitor_plans(query_plans, monitor, ijik.Member, sort="-Sukunimi")
+    assert "SCAN members USING INDEX ix_members_last_name" in plans[0]
+    assert "TEMP B-TREE" not in plans[0]
+
+# (the category field comes from CategoriesPlugin, this is the query it filters with)
+def test_filter_category(query_plans):
+    plans = query_plans(lambda db: db.query(ijik.Team)
+            .filter(ijik.Team.category == "a")
+            .order_by(ijik.Team.id)
+            .all())
+    assert "SEARCH teams USING INDEX ix_teams_category (category=?)" in plans[0]
+
+def add_registrants(ijik_app, n, prefix):
+    list(Importer(ijik_app).run({
+        "name": f"{prefix} {i}",
+        "members": [ {"first_name": f"Etu {j}", "last_name": f"{prefix} {i}"} for j in range(5) ],
+        "teams": [ {"name": f"{prefix} {i}-{j}", "members": [j, j+1, j+2]} for j in range(2) ]
+    } for i in range(n)))
+
+MONITOR_PAGES = [
+    "/monitor/secret/",
+    "/monitor/secret/table/joukkueet?offset=0&limit=100",
+    "/monitor/secret/table/joukkueet?offset=0&limit=100&sort=Ilmoittaja",
+    "/monitor/secret/table/osallistujat?offset=0&limit=100&sort=-Sukunimi"
+]
+
+def page_statements(app, monitor, statements):
+    client = TestClient(app)
+    counts = []
+
+    for path in MONITOR_PAGES:
+        monitor.cache.invalidate()
+        statements.clear()
+        assert client.get(path).status_code == 200
+        counts.append(len(statements))
+
+    return counts
+
+# the pages load their rows with their relationships in a fixed number of statements
+# (see benchmarks/monitor.py)
+def test_page_statements(app, ijik_app, monitor, statements):
+    add_registrants(ijik_app, 10, "Seuranta")
+    small = page_statements(app, monitor, statements)
+
+    add_registrants(ijik_app, 100, "Lisää seurantaa")
+    large = page_statements(app, monitor, statements)
+
+    assert small == large
+    assert large[0] <= 8
+    assert all(n <= 2 for n in large[1:]), large
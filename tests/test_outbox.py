@@ -0,0 +1,117 @@
+import contextlib
+import smtplib
+import time
+import sqlalchemy as sa
+import ijik
+
+def wait_for(f, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not (ret := f()):
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+    return ret
+
+def outbox_rows(ijik_app, to_addr):
+    with ijik_app.sessionmanager.Session() as db:
+        return [ (m.status, m.attempts) for m in db.query(ijik.OutboxMessage)
+                if m.message["to_addr"] == to_addr ]
+
+def test_signup_email(ijik_app, signup, smtp_server):
+    # the mailer enqueues from inside the registrant's transaction, this would block on
+    # sqlite's write lock if the outbox used its own session
+    signup("Outbox Tester")
+    with ijik_app.sessionmanager.Session() as db:
+        registrant = db.query(ijik.Registrant).filter_by(name="Outbox Tester").one()
+    to_addr = f"{registrant.key}@example.com"
+
+    rcpt, data = wait_for(lambda: next((m for m in smtp_server.messages if m[0] == [to_addr]), None))
+    assert "Hello Outbox Tester" in data
+    assert wait_for(lambda: outbox_rows(ijik_app, to_addr) == [("sent", 1)])
+
+def test_enqueue_rolls_back(ijik_app, outbox):
+    with ijik_app.sessionmanager.Session() as db:
+        db.execute(sa.text("SELECT 1"))
+        outbox.enqueue(ijik.Message(to_addr="rollback@example.com"), db)
+        db.rollback()
+
+    assert outbox_rows(ijik_app, "rollback@example.com") == []
+
+def test_enqueue_after_commit(ijik_app, outbox, smtp_server):
+    with ijik_app.sessionmanager.Session() as db:
+        outbox.enqueue(ijik.Message(to_addr="committed@example.com"), db)
+
+    assert wait_for(lambda: outbox_rows(ijik_app, "committed@example.com") == [("sent", 1)])
+
+def test_refused_gives_up(ijik_app, outbox, smtp_server):
+    smtp_server.refuse.add("refused@example.com")
+    outbox.enqueue(ijik.Message(to_addr="refused@example.com"))
+
+    assert wait_for(lambda: outbox_rows(ijik_app, "refused@example.com") == [("failed", 1)])
+
+def test_wake_after_commit(ijik_app, outbox):
+    worker = ijik.Outbox(ijik_app.sessionmanager, outbox.sender)
+
+    with ijik_app.sessionmanager.Session() as db:
+        db.execute(sa.text("SELECT 1"))
+        worker.enqueue(ijik.Message(to_addr="wake-rollback@example.com"), db)
+        db.rollback()
+        db.commit()
+        assert not worker.wake.is_set()
+
+        db.execute(sa.text("SELECT 1"))
+        worker.enqueue(ijik.Message(to_addr="wake@example.com"), db)
+        assert not worker.wake.is_set()
+        db.commit()
+        assert worker.wake.is_set()
+
+# an outbox on its own database, so the app's worker doesn't take its messages
+def local_outbox(tmp_path, send, **kwargs):
+    sessionmanager = ijik.SessionManager()
+    sessionmanager.connect(f"sqlite:///{tmp_path / 'outbox.sqlite3'}")
+    sessionmanager.create_tables(ijik.OutboxMessage.__table__.metadata)
+
+    @contextlib.contextmanager
+    def sender():
+        yield send
+
+    return ijik.Outbox(sessionmanager, sender, backoff=0, **kwargs)
+
+def statuses(outbox):
+    with outbox.sessionmanager.Session() as db:
+        return { m.message["to_addr"]: (m.status, m.attempts) for m in db.query(ijik.OutboxMessage) }
+
+def test_permanent_errors(tmp_path):
+    def send(message):
+        code = int(message.to_addr.split("@")[0])
+        raise smtplib.SMTPRecipientsRefused({ message.to_addr: (code, b"no") })
+
+    outbox = local_outbox(tmp_path, send, max_attempts=3)
+    outbox.enqueue(ijik.Message(to_addr="550@example.com"))
+    outbox.enqueue(ijik.Message(to_addr="450@example.com"))
+    outbox.drain()
+
+    assert statuses(outbox) == {
+            "550@example.com": ("failed", 1),
+            "450@example.com": ("pending", 1)
+    }
+
+def test_sent_once(tmp_path, monkeypatch):
+    sent = []
+    outbox = local_outbox(tmp_path, lambda message: sent.append(message.to_addr))
+    for i in range(3):
+        outbox.enqueue(ijik.Message(to_addr=f"once{i}@example.com"))
+
+    # marking the first message sent fails once
+    mark = ijik.Outbox._sent
+    fail = [ True ]
+    def _sent(self, db, row):
+        if fail.pop() if fail else False:
+            raise sa.exc.OperationalError("UPDATE", {}, Exception("database is locked"))
+        mark(self, db, row)
+    monkeypatch.setattr(ijik.Outbox, "_sent", _sent)
+
+    outbox.drain()
+    outbox.drain()
+
+    assert sorted(sent) == [ f"once{i}@example.com" for i in range(3) ]
+    assert { status for status, _ in statuses(outbox).values() } == {"sent"}
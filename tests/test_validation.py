@@ -0,0 +1,53 @@
+import ijik
+
+def test_team_size(signup, add_members):
+    client = signup()
+    members = add_members(client, 5)
+
+    r = client.post("/teams/new", json={"name": "Liian iso", "member_ids": members})
+    assert r.status_code != 200
+    assert "members" in r.text
+
+    r = client.post("/teams/new", json={"name": "Sopiva", "member_ids": members[:4]})
+    assert r.status_code == 200, r.text
+    team = r.json()["id"]
+
+    r = client.patch(f"/teams/{team}", json={"member_ids": members})
+    assert r.status_code != 200
+
+    r = client.patch(f"/teams/{team}", json={"name": "Sopiva 2"})
+    assert r.status_code == 200, r.text
+
+def test_unique_members(signup, add_members):
+    client = signup()
+    add_members(client, 1, prefix="Sama")
+
+    r = client.post("/members/new", json={"first_name": "Sama 0", "last_name": "Suku"})
+    assert r.status_code != 200
+
+def test_aggregates_per_plugin():
+    a = ijik.ValidationPlugin(entity_validators=[ijik.TeamSize(lambda team: None)])
+    b = ijik.ValidationPlugin()
+    assert a.aggregates is not b.aggregates
+
+    class App:
+        class pluginmanager:
+            register = staticmethod(lambda plugin: None)
+
+    a.ijik_plugin_init(App)
+    assert a.aggregates.needed["Team"] == {"members"}
+    assert not b.aggregates.needed
+
+def test_unique_teams_index(query_plans):
+    team = ijik.Team(name="Joukkue", category="")
+    plans = query_plans(lambda db: ijik.UniqueTeams().validate_team(team, db, True))
+
+    assert len(plans) == 1
+    assert "USING COVERING INDEX ix_teams_name_category" in plans[0]
+
+def test_unique_members_index(query_plans):
+    member = ijik.Member(registrant_id=1, first_name="Etu", last_name="Suku")
+    plans = query_plans(lambda db: ijik.UniqueMembers().validate_member(member, db, True))
+
+    assert len(plans) == 1
+    assert "USING COVERING INDEX ix_members_registrant_id_name" in plans[0]
@@ -0,0 +1,43 @@
+import threading
+import types
+import ijik
+from ijik.webhooks import Dispatcher
+
+def test_submit_while_running(ijik_app, signup):
+    signup("Webhook Tester")
+    with ijik_app.sessionmanager.Session() as db:
+        registrant_id = db.query(ijik.Registrant.id).filter_by(name="Webhook Tester").scalar()
+
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def ijik_webhook(id, kwargs):
+        calls.append(kwargs["registrant"].id)
+        started.set()
+        release.wait(5)
+
+    def ijik_uncaught_exception(exc):
+        raise exc
+
+    hook = types.SimpleNamespace(ijik_webhook=ijik_webhook, ijik_uncaught_exception=ijik_uncaught_exception)
+    dispatcher = Dispatcher(types.SimpleNamespace(hook=hook), ijik_app.sessionmanager)
+    webhook = ijik.UserWebhook("test")
+
+    try:
+        job = dispatcher.submit(webhook, registrant_id)
+        assert started.wait(5)
+        assert job.status == "running"
+
+        # a second click while the webhook runs gets the same job
+        assert dispatcher.submit(webhook, registrant_id) is job
+
+        release.set()
+        dispatcher.executor.shutdown(wait=True)
+    finally:
+        release.set()
+        dispatcher.shutdown()
+
+    assert job.status == "done"
+    assert calls == [registrant_id]
+    assert not dispatcher.pending
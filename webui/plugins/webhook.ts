@@ -8,6 +8,16 @@ import {
 } from "../components";
 import {homeAction} from "./info";
 
+$.defaults({
+	"webhook:failed": "Toiminto epäonnistui. Yritä myöhemmin uudelleen."
+});
+
+type WebhookJob = {
+	id: string;
+	status: "pending" | "running" | "done" | "failed";
+	url: string;
+};
+
 ijik.plugins.webhook = {
 
 	user: (webhook: {
@@ -16,24 +26,52 @@ ijik.plugins.webhook = {
 		endpoint: string;
 		successText?: string;
 	}) => {
-		const post = postForm({ url: webhook.endpoint });
+		const post = postForm<WebhookJob>({ url: webhook.endpoint });
+		let running = false;
+
+		const finish = () => {
+			running = false;
+			m.redraw();
+		};
+
+		const failed = (desc: string) => pushNotification(Notification.Error, desc).dismiss(5000);
+
+		// the webhook runs in the background, poll its job until it's finished
+		const wait = (job: WebhookJob): Promise<void> => {
+			if(job.status === "done") {
+				finish();
+				if(webhook.successText)
+					pushNotification(Notification.Success, webhook.successText).dismiss(5000);
+				return Promise.resolve();
+			}
+
+			if(job.status === "failed") {
+				finish();
+				failed($("webhook:failed"));
+				return Promise.resolve();
+			}
+
+			return new Promise(resolve => setTimeout(resolve, 1000))
+				.then(() => m.request<WebhookJob>({ method: "GET", url: job.url }))
+				.then(status => wait({ ...status, url: job.url }), () => {
+					finish();
+					failed($("webhook:failed"));
+				});
+		};
 
 		const invoke = () => post().then(
-			webhook.successText ? (() => pushNotification(
-				Notification.Success,
-				webhook.successText
-			).dismiss(5000)) : undefined,
-			() => pushNotification(
-				Notification.Error,
-				post.errors!.desc()
-			).dismiss(5000)
+			job => {
+				running = true;
+				return wait(job);
+			},
+			() => failed(post.errors!.desc())
 		);
 
 		homeAction({
 			title: webhook.name,
 			order: 10,
 			component: {
-				view: () => post.loading
+				view: () => (post.loading || running)
 					? m(".flex.items-center.justify-center", m("i.fas.fa-spinner.animate-spin"))
 					: action({
 						class: "bg-yellow-800 hover:bg-yellow-700",